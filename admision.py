@@ -0,0 +1,94 @@
+import time
+from collections import OrderedDict
+
+from metricas import Contador
+
+# Control de admisión de partidas nuevas y clics.
+# Cada acción pasa por varias cubetas de tokens (por usuario, canal y
+# servidor): una cubeta admite ráfagas de hasta `capacidad` acciones y se
+# recarga a `ritmo` tokens por segundo. Una acción solo se admite si todas sus
+# cubetas tienen token, y entonces consume uno de cada una. Además hay límites
+# globales de partidas activas y de búsquedas del bot en curso. Un rechazo no
+# toca MySQL ni edita mensajes: basta con una respuesta efímera.
+
+ADMISION_RECHAZOS = Contador(
+    "lavieja_admision_rechazos_total", "Acciones rechazadas por el control de admisión.", ("accion", "motivo")
+)
+
+MENSAJES_RECHAZO = {
+    "usuario": "⏳ Vas demasiado rápido, espera unos segundos.",
+    "canal": "⏳ Hay demasiada actividad en este canal, espera unos segundos.",
+    "servidor": "⏳ Se están empezando muchas partidas en este servidor, espera unos segundos.",
+    "partidas": "⏳ Hay demasiadas partidas en curso, vuelve a intentarlo más tarde.",
+    "busquedas": "⏳ El bot está pensando demasiadas jugadas a la vez, vuelve a intentarlo en unos segundos.",
+}
+
+
+class Limitador:
+    """Cubetas de tokens por clave, con un máximo de cubetas en memoria."""
+
+    def __init__(self, capacidad, ritmo, maximo=10000):
+        self.capacidad = capacidad  # Acciones seguidas como mucho
+        self.ritmo = ritmo  # Tokens recuperados por segundo
+        self.maximo = maximo
+        self._cubetas = OrderedDict()  # clave -> [tokens, instante], de la menos a la más usada
+
+    @classmethod
+    def desde_texto(cls, texto, maximo=10000):
+        """Limitador a partir de "capacidad:ritmo", p. ej. "3:0.05"."""
+        capacidad, ritmo = texto.split(":")
+        return cls(float(capacidad), float(ritmo), maximo)
+
+    def disponible(self, clave, ahora):
+        """Recarga la cubeta de la clave e indica si le queda algún token."""
+        cubeta = self._cubetas.get(clave)
+        if cubeta is None:
+            cubeta = self._cubetas[clave] = [self.capacidad, ahora]
+            if len(self._cubetas) > self.maximo:
+                # La cubeta usada hace más tiempo es la que antes estaría llena
+                self._cubetas.popitem(last=False)
+        else:
+            self._cubetas.move_to_end(clave)
+            cubeta[0] = min(self.capacidad, cubeta[0] + (ahora - cubeta[1]) * self.ritmo)
+            cubeta[1] = ahora
+        return cubeta[0] >= 1
+
+    def consumir(self, clave):
+        self._cubetas[clave][0] -= 1
+
+
+class ControlAdmision:
+    def __init__(self, inicios_usuario, inicios_canal, inicios_servidor, clics_usuario, clics_canal,
+                 clics_servidor, partidas_max=5000, busquedas_max=64):
+        self.inicios = (("usuario", inicios_usuario), ("canal", inicios_canal), ("servidor", inicios_servidor))
+        self.clics = (("usuario", clics_usuario), ("canal", clics_canal), ("servidor", clics_servidor))
+        self.partidas_max = partidas_max  # Partidas activas a partir de las que no se empiezan más
+        self.busquedas_max = busquedas_max  # Búsquedas del bot en espera o en curso a la vez
+
+    def _tomar(self, accion, limitadores, claves):
+        ahora = time.monotonic()
+        for (motivo, limitador), clave in zip(limitadores, claves):
+            if not limitador.disponible(clave, ahora):
+                ADMISION_RECHAZOS.inc(accion=accion, motivo=motivo)
+                return motivo
+        for (_, limitador), clave in zip(limitadores, claves):
+            limitador.consumir(clave)
+        return None
+
+    def admitir_inicio(self, user_id, channel_id, guild_id, partidas_activas):
+        """None si se puede empezar una partida; si no, el motivo del rechazo."""
+        if partidas_activas >= self.partidas_max:
+            ADMISION_RECHAZOS.inc(accion="inicio", motivo="partidas")
+            return "partidas"
+        return self._tomar("inicio", self.inicios, (user_id, channel_id, guild_id))
+
+    def admitir_clic(self, user_id, channel_id, guild_id):
+        """None si se atiende el clic; si no, el motivo del rechazo."""
+        return self._tomar("clic", self.clics, (user_id, channel_id, guild_id))
+
+    def admitir_busqueda(self, busquedas_en_vuelo):
+        """None si el bot puede empezar otra búsqueda; si no, el motivo del rechazo."""
+        if busquedas_en_vuelo >= self.busquedas_max:
+            ADMISION_RECHAZOS.inc(accion="clic", motivo="busquedas")
+            return "busquedas"
+        return None
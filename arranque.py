@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+from metricas import ARRANQUE_SEGUNDOS
+
+# Arranque del bot en segundo plano.
+# Las etapas que dependen de MySQL o de la API de Discord (migraciones, carga
+# de cachés, sincronización de comandos) se ejecutan en una tarea propia
+# mientras el bot conecta con el gateway. Cada etapa espera a las que declara
+# como dependencias y las independientes corren a la vez. Una etapa que falla
+# se reintenta con espera exponencial; mientras tanto el bot funciona en modo
+# degradado y lo que necesita una etapa lo comprueba con lista().
+
+
+class Arranque:
+    def __init__(self, espera_max=30.0):
+        self.espera_max = espera_max  # Segundos máximos entre reintentos de una etapa
+        self._etapas = {}  # nombre -> (función asíncrona, dependencias)
+        self._hechas = {}  # nombre -> asyncio.Event
+        self.tiempos = {}  # nombre -> (segundos de la etapa, segundos desde el inicio al terminar)
+        self.intentos = {}  # nombre -> intentos realizados
+        self._inicio = None
+        self._tarea = None
+
+    def etapa(self, nombre, funcion, despues=()):
+        """Registra una etapa que se ejecuta cuando terminan las etapas de despues."""
+        self._etapas[nombre] = (funcion, tuple(despues))
+        self._hechas[nombre] = asyncio.Event()
+
+    def lista(self, *nombres):
+        """Indica si las etapas indicadas ya terminaron."""
+        return all(self._hechas[nombre].is_set() for nombre in nombres)
+
+    @property
+    def completo(self):
+        return self.lista(*self._etapas)
+
+    def estado(self):
+        """Estado de cada etapa, para el servidor de salud."""
+        return {
+            nombre: {
+                "lista": self._hechas[nombre].is_set(),
+                "intentos": self.intentos.get(nombre, 0),
+                "segundos": round(self.tiempos[nombre][0], 3) if nombre in self.tiempos else None,
+            }
+            for nombre in self._etapas
+        }
+
+    async def iniciar(self):
+        """Lanza las etapas sin esperar a que terminen."""
+        if self._tarea is None:
+            self._inicio = time.perf_counter()
+            self._tarea = asyncio.create_task(self._correr())
+
+    async def _correr(self):
+        await asyncio.gather(*(self._correr_etapa(nombre) for nombre in self._etapas))
+        total = time.perf_counter() - self._inicio
+        detalle = ", ".join(
+            f"{nombre} {segundos:.2f} s (fin {fin:.2f} s)"
+            for nombre, (segundos, fin) in sorted(self.tiempos.items(), key=lambda kv: kv[1][1])
+        )
+        print(f"Arranque completo en {total:.2f} s: {detalle}")
+
+    async def _correr_etapa(self, nombre):
+        funcion, dependencias = self._etapas[nombre]
+        for dependencia in dependencias:
+            await self._hechas[dependencia].wait()
+        inicio = time.perf_counter()
+        espera = 1.0
+        while True:
+            self.intentos[nombre] = self.intentos.get(nombre, 0) + 1
+            try:
+                await funcion()
+                break
+            except Exception as e:
+                print(f"Error en la etapa de arranque {nombre}, se reintenta en {espera:.0f} s:", e)
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, self.espera_max)
+        fin = time.perf_counter()
+        self.tiempos[nombre] = (fin - inicio, fin - self._inicio)
+        ARRANQUE_SEGUNDOS.set(fin - inicio, etapa=nombre)
+        self._hechas[nombre].set()
+
+    async def cerrar(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
@@ -0,0 +1,245 @@
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import time
+
+import busqueda
+from historial import HistorialMovimientos, reproducir
+from motor import DIFICULTADES, TicTacToeGame, jugada_bot
+from persistencia import PersistenciaPartidas
+from tablero import VARIANTES
+
+# Benchmarks reproducibles del núcleo del juego (sin Discord ni MySQL).
+# Todas las mediciones usan semillas fijas y se repiten varias rondas,
+# quedándose con la mejor, para que los resultados sean comparables entre
+# commits:
+#
+#   python benchmark.py --salida bench.json
+#   python benchmark.py --comparar bench.json
+
+SEMILLA = 1234
+
+# Profundidad fija de búsqueda para medir nodos por segundo
+PROFUNDIDAD_NODOS = {"3x3": 9, "4x4": 4, "5x5": 3}
+
+
+def _mejor_tiempo(funcion, rondas):
+    mejor = None
+    for _ in range(rondas):
+        inicio = time.perf_counter()
+        cantidad = funcion()
+        duracion = time.perf_counter() - inicio
+        if mejor is None or duracion < mejor[0]:
+            mejor = (duracion, cantidad)
+    duracion, cantidad = mejor
+    return cantidad / duracion if duracion else float("inf")
+
+
+def bench_jugadas(variante, partidas=2000):
+    """Jugadas por segundo con jugadores aleatorios (reglas y detección de fin)."""
+    def correr():
+        rng = random.Random(SEMILLA)
+        jugadas = 0
+        for _ in range(partidas):
+            game = TicTacToeGame(0, variante=variante)
+            libres = list(range(game.variante.total))
+            rng.shuffle(libres)
+            for index in libres:
+                game.jugar(index)
+                jugadas += 1
+                if game.resultado() is not None:
+                    break
+                game.cambiar_turno()
+        return jugadas
+    return correr
+
+
+def bench_victorias(variante, tableros=5000, repeticiones=20):
+    """Comprobaciones de victoria por segundo sobre tableros aleatorios."""
+    rng = random.Random(SEMILLA)
+    partidas = []
+    for _ in range(tableros):
+        game = TicTacToeGame(0, variante=variante)
+        game.tablero = ''.join(rng.choice("XO  ") for _ in range(game.variante.total))
+        partidas.append(game)
+
+    def correr():
+        for _ in range(repeticiones):
+            for game in partidas:
+                game.verificar_ganador()
+        return tableros * repeticiones
+    return correr
+
+
+def bench_nodos(variante, posiciones=5):
+    """Nodos de búsqueda por segundo a profundidad fija."""
+    rng = random.Random(SEMILLA)
+    info = VARIANTES[variante]
+    inicios = []
+    for _ in range(posiciones):
+        x = o = 0
+        for turno, index in enumerate(rng.sample(range(info.total), 2)):
+            if turno % 2 == 0:
+                x |= info.casillas[index]
+            else:
+                o |= info.casillas[index]
+        inicios.append((x, o))
+
+    def correr():
+        random.seed(SEMILLA)
+        motor = busqueda.Motor(info)  # Tabla de transposición vacía en cada ronda
+        nodos = 0
+        for x, o in inicios:
+            _, _, n = motor.buscar(x, o, "X", profundidad=PROFUNDIDAD_NODOS[variante])
+            nodos += n
+        return nodos
+    return correr
+
+
+def bench_autojuego(variante, dificultad, partidas=20):
+    """Partidas completas bot contra bot por segundo."""
+    def correr():
+        random.seed(SEMILLA)
+        busqueda.MOTORES.clear()
+        for _ in range(partidas):
+            game = TicTacToeGame(0, dificultad=dificultad, variante=variante)
+            game.modo_vs_bot = True
+            while True:
+                game.bot_marker = game.jugador_actual
+                game.jugar(jugada_bot(game))
+                if game.resultado() is not None:
+                    break
+                game.cambiar_turno()
+        return partidas
+    return correr
+
+
+class _TablasEnMemoria:
+    """Base de datos y cursor mínimos que guardan las filas escritas en diccionarios."""
+
+    def __init__(self):
+        self.partidas = {}  # message_id -> fila
+        self.movimientos = {}  # partida -> [(numero, casilla, ficha)]
+
+    def execute(self, sql, params=()):
+        if sql.startswith("DELETE"):
+            for message_id in params:
+                self.partidas.pop(message_id, None)
+        # El UPDATE de actividad no cambia nada que se vuelva a leer aquí
+
+    def executemany(self, sql, filas):
+        for fila in filas:
+            if "INTO partidas" in sql:
+                self.partidas[fila[0]] = fila
+            else:
+                self.movimientos.setdefault(fila[0], []).append((fila[2], fila[3], fila[4]))
+
+    async def transaccion(self, funcion):
+        return funcion(self)
+
+    async def ejecutar_varios(self, sql, filas):
+        self.executemany(sql, filas)
+
+    async def uno(self, sql, params=()):
+        return self.partidas.get(params[0])
+
+    async def todos(self, sql, params=()):
+        return [(casilla, ficha) for _, casilla, ficha in sorted(self.movimientos.get(params[0], ()))]
+
+
+def bench_persistencia(variante, partidas=2000):
+    """Partidas por segundo guardadas, escritas en lote, cargadas y reconstruidas."""
+    rng = random.Random(SEMILLA)
+    juegos = []
+    for i in range(partidas):
+        libres = list(range(VARIANTES[variante].total))
+        rng.shuffle(libres)
+        juegos.append((rng.choice(DIFICULTADES), libres[:rng.randrange(len(libres))]))
+
+    async def ronda():
+        # Mismo recorrido que el bot: la partida se guarda al empezar, las
+        # jugadas van al historial y tras reiniciar se carga la fila y se
+        # reproducen las jugadas
+        db = _TablasEnMemoria()
+        persistencia = PersistenciaPartidas(db, lote=partidas)
+        historial = HistorialMovimientos(db, lote=partidas)
+        for i, (dificultad, jugadas) in enumerate(juegos):
+            game = TicTacToeGame(i, dificultad=dificultad, variante=variante)
+            game.jugadores = {"X": f"<@{i}>", "O": f"<@{i + 1}>"}
+            persistencia.guardar(i, game)
+            for index in jugadas:
+                ficha = game.jugador_actual
+                game.jugar(index)
+                historial.registrar(i, game, index, ficha)
+                persistencia.tocar(i)
+                game.cambiar_turno()
+        await persistencia.flush()
+        await historial.flush()
+        for i in range(partidas):
+            reproducir(await persistencia.cargar(i), await historial.jugadas(i))
+        return partidas
+
+    def correr():
+        return asyncio.run(ronda())
+    return correr
+
+
+def casos():
+    for variante in VARIANTES:
+        yield f"jugadas_por_s[{variante}]", bench_jugadas(variante)
+        yield f"victorias_por_s[{variante}]", bench_victorias(variante)
+        yield f"nodos_por_s[{variante}]", bench_nodos(variante)
+        yield f"persistencia_por_s[{variante}]", bench_persistencia(variante)
+        for dificultad in DIFICULTADES:
+            # Las búsquedas limitadas por tiempo no son reproducibles
+            if busqueda.NIVELES[dificultad]["profundidad"] is None and variante != "3x3":
+                continue
+            yield f"partidas_por_s[{variante},{dificultad}]", bench_autojuego(variante, dificultad)
+
+
+def commit_actual():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del motor de La Vieja.")
+    parser.add_argument("--rondas", type=int, default=3, help="Rondas por caso (se toma la mejor).")
+    parser.add_argument("--filtro", default="", help="Solo los casos cuyo nombre contenga este texto.")
+    parser.add_argument("--salida", help="Guardar los resultados en un archivo JSON.")
+    parser.add_argument("--comparar", help="Archivo JSON de una ejecución anterior para comparar.")
+    args = parser.parse_args()
+
+    base = None
+    if args.comparar:
+        with open(args.comparar) as f:
+            base = json.load(f)
+
+    resultados = {}
+    for nombre, caso in casos():
+        if args.filtro not in nombre:
+            continue
+        resultados[nombre] = valor = _mejor_tiempo(caso, args.rondas)
+        linea = f"{nombre:<36} {valor:>14,.1f}"
+        if base and nombre in base["resultados"]:
+            linea += f"   x{valor / base['resultados'][nombre]:.2f} vs {base.get('commit')}"
+        print(linea, flush=True)
+
+    if args.salida:
+        with open(args.salida, "w") as f:
+            json.dump({
+                "commit": commit_actual(),
+                "python": platform.python_version(),
+                "resultados": resultados,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,33 @@
-import discord
-import random
-import os
-import webserver
+import asyncio
+import hashlib
 import json
-import mysql.connector
-import asyncio  # Asegúrate de importar asyncio al inicio del archivo
-from discord.ext import commands
+import math
+import os
+
+import discord
 from discord import app_commands
-from discord.ui import View, Button
+from discord.ext import commands
+from discord.ui import Button, View
 from dotenv import load_dotenv
-from functools import partial
+
+import metricas
+import migraciones
+import render
+from admision import ControlAdmision, Limitador, MENSAJES_RECHAZO
+from arranque import Arranque
+from calculo import CalculadorJugadas
+from db import BaseDeDatos
+from ediciones import ProgramadorEdiciones
+from estadisticas import CacheEstadisticas
+from historial import HistorialMovimientos, reproducir
+from metricas import cronometrado
+from motor import EMPATE, VICTORIA, TicTacToeGame
+from persistencia import PersistenciaPartidas, id_de_mencion
+from registro import RegistroPartidas
+from render import FICHAS
+from shards import Particion, shard_de
+from temporizador import RuedaTemporizadores
+from webserver import ServidorSalud
 
 # Cargar variables de entorno
 load_dotenv()
@@ -18,360 +36,512 @@ MYSQL_HOST = os.getenv("MYSQLHOST")
 MYSQL_USER = os.getenv("MYSQLUSER")
 MYSQL_PASSWORD = os.getenv("MYSQLPASSWORD")
 MYSQL_DATABASE = os.getenv("MYSQLDATABASE")
+PERSISTENCIA_INTERVALO = float(os.getenv("PERSISTENCIA_INTERVALO", "2"))
+PERSISTENCIA_LOTE = int(os.getenv("PERSISTENCIA_LOTE", "50"))
+HISTORIAL_INTERVALO = float(os.getenv("HISTORIAL_INTERVALO", "2"))
+HISTORIAL_LOTE = int(os.getenv("HISTORIAL_LOTE", "200"))
+MYSQL_POOL = int(os.getenv("MYSQL_POOL", "5"))
+MYSQL_TIMEOUT = int(os.getenv("MYSQL_TIMEOUT", "10"))
+BOT_PROCESOS = int(os.getenv("BOT_PROCESOS", "0")) or None
+BOT_TIMEOUT_JUGADA = float(os.getenv("BOT_TIMEOUT_JUGADA", "5"))
+BOT_RETARDO = float(os.getenv("BOT_RETARDO", "0.3"))  # Pausa antes de la jugada del bot
+EDICIONES_MAX = int(os.getenv("EDICIONES_MAX", "25"))
+STATS_INTERVALO = float(os.getenv("STATS_INTERVALO", "5"))
+STATS_LOTE = int(os.getenv("STATS_LOTE", "100"))
+STATS_INTERVALO_VERSIONES = float(os.getenv("STATS_INTERVALO_VERSIONES", "30"))
+PARTIDAS_MAX = int(os.getenv("PARTIDAS_MAX", "10000"))  # Partidas en memoria como mucho
+PARTIDAS_TTL = float(os.getenv("PARTIDAS_TTL", "300"))  # Segundos de inactividad antes de expirar
+PARTIDAS_BARRIDO = float(os.getenv("PARTIDAS_BARRIDO", "60"))
+TURNO_SEGUNDOS = float(os.getenv("TURNO_SEGUNDOS", "120"))  # Plazo de cada turno; 0 lo desactiva
+FIN_SEGUNDOS = 180  # Plazo de los botones de fin de partida
+FICHA_SEGUNDOS = 60  # Plazo de la selección de ficha
+# Cubetas de admisión como "capacidad:tokens por segundo"
+ADMISION_INICIOS_USUARIO = os.getenv("ADMISION_INICIOS_USUARIO", "3:0.1")
+ADMISION_INICIOS_CANAL = os.getenv("ADMISION_INICIOS_CANAL", "10:0.5")
+ADMISION_INICIOS_SERVIDOR = os.getenv("ADMISION_INICIOS_SERVIDOR", "30:2")
+ADMISION_CLICS_USUARIO = os.getenv("ADMISION_CLICS_USUARIO", "8:4")
+ADMISION_CLICS_CANAL = os.getenv("ADMISION_CLICS_CANAL", "40:20")
+ADMISION_CLICS_SERVIDOR = os.getenv("ADMISION_CLICS_SERVIDOR", "200:100")
+ADMISION_PARTIDAS_MAX = int(os.getenv("ADMISION_PARTIDAS_MAX", "5000"))  # Partidas activas antes de rechazar /start
+ADMISION_BUSQUEDAS_MAX = int(os.getenv("ADMISION_BUSQUEDAS_MAX", "0")) or None  # None: según el tamaño del pool
+# Varios procesos: SHARD_COUNT shards en total y SHARD_IDS los de este proceso
+particion = Particion.desde_texto(os.getenv("SHARD_COUNT"), os.getenv("SHARD_IDS"))
+# Servidor HTTP de salud y administración (cada proceso necesita su propio puerto)
+PORT = int(os.getenv("PORT", "8000"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")  # Sin token no hay rutas /admin
+SALUD_RETRASO_MAX = float(os.getenv("SALUD_RETRASO_MAX", "0.5"))  # Segundos de retraso del loop tolerados
+TAMANO_PAGINA = 25  # Jugadores por página de /leaderboard
+EXCLUDED_USER_ID = 1334910035054297131  # ID del usuario "La Vieja" a excluir de la tabla
 
 # Configuración del bot
 intents = discord.Intents.default()
 intents.message_content = True
-bot = commands.Bot(command_prefix="!", intents=intents)
 
-# Emojis para fichas
-FICHAS = {"X": "❎", "O": "🅾️", " ": "⬜"}
+class LaViejaBot(commands.AutoShardedBot):
+    async def setup_hook(self):
+        # Se ejecuta una sola vez antes de conectar; on_ready se repite en
+        # cada reconexión. Aquí solo se prepara lo que no espera a MySQL ni a
+        # la API: el resto corre en segundo plano mientras se conecta al gateway
+        try:
+            await servidor.iniciar()
+        except OSError as e:
+            # Sin /health ni /metrics el bot sigue pudiendo jugar
+            print("Error al iniciar el servidor HTTP:", e)
+        await partidas.iniciar()
+        await temporizadores.iniciar()
+        calculador.iniciar()
+        # Los botones de los tableros se atienden aunque el bot se haya
+        # reiniciado: la partida se carga en el primer clic
+        self.add_dynamic_items(CasillaBoton)
+        await arranque.iniciar()
+
+    async def close(self):
+        await arranque.cerrar()
+        await temporizadores.cerrar()
+        await partidas.cerrar()
+        # Última escritura de las partidas pendientes antes de desconectar
+        try:
+            await persistencia.cerrar()
+        except Exception as e:
+            print("Error al guardar partidas:", e)
+        try:
+            await historial.cerrar()
+        except Exception as e:
+            print("Error al guardar movimientos:", e)
+        try:
+            await estadisticas.cerrar()
+        except Exception as e:
+            print("Error al guardar estadísticas:", e)
+        await super().close()
+        await servidor.cerrar()
+        calculador.cerrar()
+        db.cerrar()
+
+bot = LaViejaBot(
+    command_prefix="!",
+    intents=intents,
+    shard_count=particion.total,
+    shard_ids=sorted(particion.ids) if particion.ids is not None else None
+)
 
-# Conectar a la base de datos
-db = mysql.connector.connect(
+# Conexión a la base de datos: pool asíncrono con tamaño y tiempo límite acotados
+db = BaseDeDatos(
+    tamano=MYSQL_POOL,
+    timeout=MYSQL_TIMEOUT,
     host=MYSQL_HOST,
     user=MYSQL_USER,
     password=MYSQL_PASSWORD,
     database=MYSQL_DATABASE
 )
-cursor = db.cursor()
-
-# Crear tablas si no existen
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS partidas (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    guild_id BIGINT,
-    message_id BIGINT,
-    tablero VARCHAR(9),
-    jugador_actual CHAR(1),
-    modo_vs_bot BOOLEAN,
-    partida_activa BOOLEAN,
-    jugadores JSON,
-    dificultad VARCHAR(10)
+
+async def sincronizar_comandos():
+    """Sincroniza los comandos con Discord solo si han cambiado desde la última vez."""
+    definicion = [comando.to_dict(bot.tree) for comando in bot.tree.get_commands()]
+    huella = hashlib.sha256(json.dumps(definicion, sort_keys=True).encode()).hexdigest()
+    try:
+        fila = await db.uno("SELECT valor FROM bot_meta WHERE clave = 'comandos'")
+    except Exception as e:
+        print("Error al leer la huella de los comandos:", e)
+        fila = None
+    if fila is not None and fila[0] == huella:
+        return
+    await bot.tree.sync()
+    try:
+        await db.ejecutar(
+            "INSERT INTO bot_meta (clave, valor) VALUES ('comandos', %s) "
+            "ON DUPLICATE KEY UPDATE valor = VALUES(valor)",
+            (huella,)
+        )
+    except Exception as e:
+        print("Error al guardar la huella de los comandos:", e)
+
+def partida_expulsada(message_id, game, motivo):
+    """Libera una partida abandonada o expulsada del registro."""
+    game.terminar()
+    vistas.pop(message_id, None)
+    persistencia.eliminar(message_id)
+    calculador.cancelar(message_id)
+    ediciones.descartar(message_id)
+    temporizadores.cancelar("turno", message_id)
+
+# Almacenar partidas activas (clave: ID del mensaje), con expiración por
+# inactividad y un máximo de partidas en memoria
+partidas = RegistroPartidas(PARTIDAS_MAX, PARTIDAS_TTL, PARTIDAS_BARRIDO, al_expulsar=partida_expulsada)
+
+# Vistas de los tableros en memoria (clave: ID del mensaje)
+vistas = {}
+cargas = {}  # ID del mensaje -> rehidratación en curso
+jugadas_pendientes = set()  # Jugadas del bot lanzadas al recargar una partida
+
+# Plazos de turnos y vistas en una sola rueda de temporizadores; los manejadores
+# se registran más abajo, junto a update_stats
+temporizadores = RuedaTemporizadores()
+
+def estado_shards():
+    """Conexión, latencia, servidores y partidas en memoria de cada shard de este proceso."""
+    total = bot.shard_count or 1
+    estado = {
+        shard_id: {
+            "conectado": not shard.is_closed(),
+            "latencia": shard.latency if math.isfinite(shard.latency) else None,
+            "servidores": 0,
+            "partidas": 0,
+        }
+        for shard_id, shard in bot.shards.items()
+    }
+    for guild in bot.guilds:
+        if guild.shard_id in estado:
+            estado[guild.shard_id]["servidores"] += 1
+    for game in partidas.values():
+        shard_id = shard_de(game.guild_id, total)
+        if shard_id in estado:
+            estado[shard_id]["partidas"] += 1
+    return estado
+
+metricas.PARTIDAS_ACTIVAS.funcion = lambda: len(partidas)
+metricas.SHARD_LATENCIA.funcion = lambda: {
+    s: e["latencia"] for s, e in estado_shards().items() if e["latencia"] is not None
+}
+metricas.SHARD_CONECTADO.funcion = lambda: {s: int(e["conectado"]) for s, e in estado_shards().items()}
+metricas.SHARD_PARTIDAS.funcion = lambda: {s: e["partidas"] for s, e in estado_shards().items()}
+
+# Estadísticas de jugadores por servidor: caché en memoria con escritura por lotes
+estadisticas = CacheEstadisticas(
+    db, STATS_INTERVALO, STATS_LOTE, STATS_INTERVALO_VERSIONES,
+    excluidos={EXCLUDED_USER_ID},
+    particion=particion
+)
+
+# Escritura diferida de partidas: solo las filas modificadas, en lotes.
+# Las filas caducadas las borra solo el proceso del shard 0
+persistencia = PersistenciaPartidas(
+    db, PERSISTENCIA_INTERVALO, PERSISTENCIA_LOTE, ttl=PARTIDAS_TTL,
+    intervalo_purga=PARTIDAS_BARRIDO if particion.principal else None
 )
-""")
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS stats (
-    guild_id BIGINT,
-    user VARCHAR(255),
-    wins INT DEFAULT 0,
-    losses INT DEFAULT 0,
-    draws INT DEFAULT 0,
-    PRIMARY KEY (guild_id, user)
+
+# Registro de solo inserción con cada jugada, escrito por lotes
+historial = HistorialMovimientos(db, HISTORIAL_INTERVALO, HISTORIAL_LOTE)
+
+# Búsquedas del bot en un pool de procesos
+calculador = CalculadorJugadas(BOT_PROCESOS, BOT_TIMEOUT_JUGADA)
+
+# Una edición por turno y mensaje, con número de ediciones simultáneas acotado
+ediciones = ProgramadorEdiciones(EDICIONES_MAX)
+
+# Límites de ritmo por usuario, canal y servidor y de carga global
+admision = ControlAdmision(
+    inicios_usuario=Limitador.desde_texto(ADMISION_INICIOS_USUARIO),
+    inicios_canal=Limitador.desde_texto(ADMISION_INICIOS_CANAL),
+    inicios_servidor=Limitador.desde_texto(ADMISION_INICIOS_SERVIDOR),
+    clics_usuario=Limitador.desde_texto(ADMISION_CLICS_USUARIO),
+    clics_canal=Limitador.desde_texto(ADMISION_CLICS_CANAL),
+    clics_servidor=Limitador.desde_texto(ADMISION_CLICS_SERVIDOR),
+    partidas_max=ADMISION_PARTIDAS_MAX,
+    busquedas_max=ADMISION_BUSQUEDAS_MAX or calculador.capacidad()
+)
+
+async def avisar_rechazo(interaction: discord.Interaction, motivo):
+    """Respuesta efímera a una acción no admitida; no consulta MySQL ni edita mensajes."""
+    await interaction.response.send_message(MENSAJES_RECHAZO[motivo], ephemeral=True)
+
+def admitir_inicio(interaction: discord.Interaction):
+    return admision.admitir_inicio(interaction.user.id, interaction.channel.id, interaction.guild.id, len(partidas))
+
+async def iniciar_escritura():
+    await persistencia.iniciar()
+    await historial.iniciar()
+
+async def cargar_estadisticas():
+    await estadisticas.cargar()
+    await estadisticas.iniciar()
+
+# Etapas del arranque que dependen de MySQL o de la API de Discord
+arranque = Arranque()
+arranque.etapa("migraciones", lambda: migraciones.aplicar(db))
+arranque.etapa("escritura", iniciar_escritura, despues=["migraciones"])
+arranque.etapa("estadisticas", cargar_estadisticas, despues=["migraciones"])
+if particion.principal:
+    # Los comandos son globales: basta con que los sincronice un proceso
+    arranque.etapa("comandos", sincronizar_comandos, despues=["migraciones"])
+arranque.etapa("calculador", calculador.calentar)
+
+async def aviso_arranque(interaction: discord.Interaction, *etapas):
+    """Responde con un aviso si alguna etapa del arranque aún no terminó."""
+    if arranque.lista(*etapas):
+        return False
+    await interaction.response.send_message(
+        "⏳ El bot está terminando de arrancar, vuelve a intentarlo en unos segundos.",
+        ephemeral=True
+    )
+    return True
+
+# Salud, métricas y administración por HTTP en el mismo event loop
+servidor = ServidorSalud(
+    PORT, shards=estado_shards, db=db, partidas=partidas, arranque=arranque,
+    token_admin=ADMIN_TOKEN, retraso_max=SALUD_RETRASO_MAX
 )
-""")
-db.commit()
-
-# Almacenar partidas activas (clave: ID del mensaje)
-partidas = {}
-
-# Almacenar estadísticas de jugadores por servidor
-stats = {}
-
-def save_partidas():
-    cursor.execute("DELETE FROM partidas")
-    for message_id, game in partidas.items():
-        cursor.execute("""
-        INSERT INTO partidas (guild_id, message_id, tablero, jugador_actual, modo_vs_bot, partida_activa, jugadores, dificultad)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            game.guild_id, message_id, ''.join(game.tablero),
-            game.jugador_actual, game.modo_vs_bot, game.partida_activa,
-            json.dumps(game.jugadores), game.dificultad
-        ))
-    db.commit()
-
-def load_partidas():
-    global partidas
-    cursor.execute("SELECT * FROM partidas")
-    for row in cursor.fetchall():
-        game = TicTacToeGame(guild_id=row[1], dificultad=row[8])
-        game.tablero = list(row[3])
-        game.jugador_actual = row[4]
-        game.modo_vs_bot = row[5]
-        game.partida_activa = row[6]
-        game.jugadores = json.loads(row[7])
-        partidas[row[2]] = game
-
-def save_stats():
-    cursor.execute("DELETE FROM stats")
-    for guild_id, users in stats.items():
-        for user, user_stats in users.items():
-            cursor.execute("""
-            INSERT INTO stats (guild_id, user, wins, losses, draws)
-            VALUES (%s, %s, %s, %s, %s)
-            """, (
-                guild_id, user, user_stats["wins"],
-                user_stats["losses"], user_stats["draws"]
-            ))
-    db.commit()
-
-def load_stats():
-    global stats
-    cursor.execute("SELECT * FROM stats")
-    for row in cursor.fetchall():
-        guild_id, user, wins, losses, draws = row
-        if guild_id not in stats:
-            stats[guild_id] = {}
-        stats[guild_id][user] = {"wins": wins, "losses": losses, "draws": draws}
+
+async def rehidratar(message_id, message):
+    game = partidas.get(message_id)
+    if game is None:
+        game = await persistencia.cargar(message_id, bot.user.id)
+        if game is None or not game.partida_activa:
+            return None
+        # La fila guarda el tablero del inicio; las jugadas están en el registro
+        reproducir(game, await historial.jugadas(message_id))
+        partidas[message_id] = game
+    view = TicTacToeView(game, message_id)
+    view.message = message
+    vistas[message_id] = view
+    view.iniciar_reloj()
+    if game.modo_vs_bot and game.jugador_actual == game.bot_marker:
+        # El bot no llegó a jugar antes de apagarse (o le tocaba abrir): juega
+        # ahora, y los clics que lleguen mientras tanto se descartan por el lock
+        tarea = asyncio.ensure_future(jugada_pendiente(view))
+        jugadas_pendientes.add(tarea)
+        tarea.add_done_callback(jugadas_pendientes.discard)
+    return view
+
+async def jugada_pendiente(view):
+    """Jugada del bot en una partida recargada con su turno pendiente."""
+    try:
+        async with view.lock:
+            if view.game.partida_activa and view.game.jugador_actual == view.game.bot_marker:
+                await view.bot_move(None)
+    except Exception as e:
+        print(f"Error en la jugada pendiente de la partida {view.message_id}:", e)
+
+async def obtener_vista(message_id, message):
+    """Vista de un tablero; tras un reinicio se carga desde MySQL en el primer clic."""
+    view = vistas.get(message_id)
+    if view is not None:
+        return view
+    carga = cargas.get(message_id)
+    if carga is None:
+        # Clics simultáneos sobre la misma partida comparten una sola carga
+        carga = cargas[message_id] = asyncio.ensure_future(rehidratar(message_id, message))
+        carga.add_done_callback(lambda _: cargas.pop(message_id, None))
+    return await asyncio.shield(carga)
 
 def update_stats(guild_id, winner, loser):
     """Actualiza las estadísticas tras una victoria."""
-    cursor.execute("""
-        INSERT INTO stats (guild_id, user, wins, losses, draws)
-        VALUES (%s, %s, 1, 0, 0)
-        ON DUPLICATE KEY UPDATE wins = wins + 1
-    """, (guild_id, winner))
-    cursor.execute("""
-        INSERT INTO stats (guild_id, user, wins, losses, draws)
-        VALUES (%s, %s, 0, 1, 0)
-        ON DUPLICATE KEY UPDATE losses = losses + 1
-    """, (guild_id, loser))
-    db.commit()
+    estadisticas.sumar(guild_id, id_de_mencion(winner), wins=1)
+    estadisticas.sumar(guild_id, id_de_mencion(loser), losses=1)
 
 def update_draw(guild_id, player1, player2):
     """Actualiza las estadísticas en caso de empate."""
-    cursor.execute("""
-        INSERT INTO stats (guild_id, user, wins, losses, draws)
-        VALUES (%s, %s, 0, 0, 1)
-        ON DUPLICATE KEY UPDATE draws = draws + 1
-    """, (guild_id, player1))
-    cursor.execute("""
-        INSERT INTO stats (guild_id, user, wins, losses, draws)
-        VALUES (%s, %s, 0, 0, 1)
-        ON DUPLICATE KEY UPDATE draws = draws + 1
-    """, (guild_id, player2))
-    db.commit()
-
-class TicTacToeGame:
-    def __init__(self, guild_id, dificultad="dificil"):
-        self.guild_id = guild_id
-        self.tablero = [" "] * 9
-        self.jugador_actual = "X"  # Se sobreescribirá según la selección
-        self.modo_vs_bot = False
-        self.partida_activa = False
-        self.jugadores = {}
-        self.dificultad = dificultad  # "facil", "medio", "dificil"
-        self.bot_marker = None  # Se asigna al iniciar partida vs bot
-
-    def verificar_ganador(self):
-        combinaciones_ganadoras = [
-            [0, 1, 2], [3, 4, 5], [6, 7, 8],
-            [0, 3, 6], [1, 4, 7], [2, 5, 8],
-            [0, 4, 8], [2, 4, 6]
-        ]
-        for a, b, c in combinaciones_ganadoras:
-            if self.tablero[a] == self.tablero[b] == self.tablero[c] and self.tablero[a] != " ":
-                return True
-        return False
+    estadisticas.sumar(guild_id, id_de_mencion(player1), draws=1)
+    estadisticas.sumar(guild_id, id_de_mencion(player2), draws=1)
+
+async def turno_agotado(message_id, jugadas):
+    """Da la partida por perdida a quien no jugó antes de que venciera su turno."""
+    view = vistas.get(message_id)
+    if view is None:
+        return
+    async with view.lock:
+        game = view.game
+        # Una jugada pudo llegar justo cuando vencía el plazo
+        if not game.partida_activa or (game.x | game.o).bit_count() != jugadas:
+            return
+        perdedor_marker = game.jugador_actual
+        ganador_marker = "X" if perdedor_marker == "O" else "O"
+        ganador = game.jugadores[ganador_marker]
+        perdedor = game.jugadores[perdedor_marker]
+        game.terminar()
+        view.disable_buttons()
+        update_stats(game.guild_id, ganador, perdedor)
+        vistas.pop(message_id, None)
+        if message_id in partidas:
+            del partidas[message_id]
+            persistencia.eliminar(message_id)
+        calculador.cancelar(message_id)
+        if view.message is not None:
+            await view.update_message(None, embed=render.embed_tiempo_agotado(ganador, perdedor))
+
+async def turnos_agotados(lote):
+    """Resuelve a la vez los turnos vencidos en un tick; las ediciones salen en paralelo."""
+    resultados = await asyncio.gather(
+        *(turno_agotado(message_id, jugadas) for message_id, jugadas in lote),
+        return_exceptions=True
+    )
+    for error in resultados:
+        if isinstance(error, Exception):
+            print("Error al cerrar una partida por tiempo:", error)
+
+async def vistas_caducadas(lote):
+    """Desactiva a la vez los botones de las vistas vencidas en un tick."""
+    resultados = await asyncio.gather(*(vista.caducar() for vista, _ in lote), return_exceptions=True)
+    for error in resultados:
+        if isinstance(error, Exception):
+            print("Error al desactivar una vista:", error)
+
+temporizadores.al_vencer("turno", turnos_agotados)
+temporizadores.al_vencer("vista", vistas_caducadas)
+
+class CasillaBoton(discord.ui.DynamicItem[Button], template=r"lavieja:(?P<partida>[0-9]+):(?P<casilla>[0-9]+)"):
+    """Casilla de un tablero; su custom_id identifica la partida y sobrevive a los reinicios."""
+
+    def __init__(self, message_id, index, **kwargs):
+        super().__init__(Button(custom_id=render.custom_id_casilla(message_id, index), **kwargs))
+        self.message_id = message_id
+        self.index = index
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item, match):
+        return cls(int(match["partida"]), int(match["casilla"]))
+
+    async def callback(self, interaction: discord.Interaction):
+        motivo = admision.admitir_clic(interaction.user.id, interaction.channel.id, interaction.guild.id)
+        if motivo is not None:
+            await avisar_rechazo(interaction, motivo)
+            return
+        # Las partidas que no están en memoria se cargan de MySQL
+        if self.message_id not in vistas and await aviso_arranque(interaction, "migraciones"):
+            return
+        view = await obtener_vista(self.message_id, interaction.message)
+        if view is None:
+            await interaction.response.send_message(
+                "⚠️ Esta partida ya no está disponible. Usa `/start` para jugar.",
+                ephemeral=True
+            )
+            return
+        await view.handle_click(interaction, self.index)
 
 class TicTacToeView(View):
     def __init__(self, game, message_id):
-        super().__init__(timeout=300)
+        # Sin timeout propio: las casillas se atienden como elementos dinámicos
+        # y la inactividad la controla el registro de partidas
+        super().__init__(timeout=None)
         self.game = game
         self.message_id = message_id
         self.message = None  # Almacena el mensaje asociado a la vista
-        # Crear 9 botones para las casillas
-        for i in range(9):
-            button = Button(
-                style=self.get_button_style(self.game.tablero[i]),
-                label=FICHAS[self.game.tablero[i]],
-                row=i // 3
-            )
-            button.callback = partial(self.handle_click, index=i)
-            self.add_item(button)
-
-    def get_button_style(self, symbol):
-        if symbol == "X":
-            return discord.ButtonStyle.success
-        elif symbol == "O":
-            return discord.ButtonStyle.danger
-        else:
-            return discord.ButtonStyle.secondary
+        # Serializa las transiciones de la partida: clics y jugadas del bot
+        self.lock = asyncio.Lock()
+        # Las casillas no son elementos de la vista: sus clics llegan por
+        # CasillaBoton y el tablero se envía ya serializado
+        self.botones = render.BotonesTablero(message_id, game.variante, game.tablero)
 
-    async def disable_buttons(self, interaction: discord.Interaction):
-        for child in self.children:
-            child.disabled = True
-        await interaction.message.edit(view=self)
+    def to_components(self):
+        return self.botones.filas
+
+    def is_finished(self):
+        # Sin elementos propios no hay nada que atender: discord.py no la
+        # registra en su ViewStore al enviar o editar el mensaje
+        return True
+
+    def marcar_boton(self, index, ficha):
+        self.botones.marcar(index, ficha)
+
+    def disable_buttons(self):
+        self.botones.desactivar()
+
+    def iniciar_reloj(self):
+        """Programa el plazo del turno en curso; el turno del bot no tiene plazo."""
+        if not TURNO_SEGUNDOS or not self.game.partida_activa:
+            return
+        if self.game.modo_vs_bot and self.game.jugador_actual == self.game.bot_marker:
+            temporizadores.cancelar("turno", self.message_id)
+            return
+        # Las jugadas hechas identifican el turno al que pertenece el plazo
+        jugadas = (self.game.x | self.game.o).bit_count()
+        temporizadores.programar("turno", self.message_id, TURNO_SEGUNDOS, jugadas)
+
+    def turn_embed(self, inicio=False):
+        jugadores = self.game.jugadores
+        return render.embed_turno(jugadores["X"], jugadores["O"], self.game.jugador_actual, inicio)
+
+    async def update_message(self, interaction: discord.Interaction, **cambios):
+        """Envía el estado acumulado del tablero en una sola edición."""
+        if interaction is not None and not interaction.response.is_done() and interaction.message is not None:
+            # Responder a la interacción editando el mensaje: confirma y edita en una llamada
+            editor = interaction.response.edit_message
+        else:
+            editor = self.message.edit
+        await ediciones.editar(self.message_id, editor, view=self, **cambios)
 
-    async def send_game_end(self, interaction: discord.Interaction):
+    async def send_game_end(self, interaction: discord.Interaction, resultado: str):
         """Envía el mensaje final común para victoria o empate."""
-        embed_end = discord.Embed(
-            title="Juego terminado",
-            description="Selecciona una opción:",
-            color=discord.Color.purple()
+        temporizadores.cancelar("turno", self.message_id)
+        # Resultado y opciones de fin de partida en un único mensaje
+        # Sin interacción (jugada del bot tras recargar la partida) se responde al tablero
+        if interaction is not None:
+            mensaje, canal = interaction.message, interaction.channel
+        else:
+            mensaje, canal = self.message, self.message.channel
+        fin = GameEndView(self.game, canal)
+        fin.message = await mensaje.reply(
+            f"{resultado}\n📊 Estadísticas actualizadas.",
+            embed=render.EMBED_FIN,
+            view=fin
         )
-        await interaction.channel.send(embed=embed_end, view=GameEndView(self.game, interaction.channel))
+        vistas.pop(self.message_id, None)
         if self.message_id in partidas:
             del partidas[self.message_id]
-            save_partidas()
+            persistencia.eliminar(self.message_id)
 
+    @cronometrado("check_endgame")
     async def check_endgame(self, interaction: discord.Interaction):
-        if self.game.verificar_ganador():
-            self.game.partida_activa = False
-            await self.disable_buttons(interaction)
+        resultado = self.game.resultado()
+        if resultado == VICTORIA:
+            self.game.terminar()
+            self.disable_buttons()
+            await self.update_message(interaction)
             ganador_marker = self.game.jugador_actual
             ganador = self.game.jugadores[ganador_marker]
             perdedor_marker = "X" if ganador_marker == "O" else "O"
             perdedor = self.game.jugadores[perdedor_marker]
-            update_stats(interaction.guild.id, ganador, perdedor)
-            await interaction.message.reply(
-                f"🏆 ¡{ganador} ha ganado con {FICHAS[ganador_marker]}!\n📊 Estadísticas actualizadas."
-            )
-            await self.send_game_end(interaction)
-            if not interaction.response.is_done():
-                await interaction.response.defer()
+            update_stats(self.game.guild_id, ganador, perdedor)
+            await self.send_game_end(interaction, f"🏆 ¡{ganador} ha ganado con {FICHAS[ganador_marker]}!")
             return True
-        elif " " not in self.game.tablero:
-            self.game.partida_activa = False
-            await self.disable_buttons(interaction)
-            update_draw(interaction.guild.id, self.game.jugadores["X"], self.game.jugadores["O"])
-            await interaction.message.reply("😲 ¡Empate!\n📊 Estadísticas actualizadas.")
-            await self.send_game_end(interaction)
-            if not interaction.response.is_done():
-                await interaction.response.defer()
+        elif resultado == EMPATE:
+            self.game.terminar()
+            self.disable_buttons()
+            await self.update_message(interaction)
+            update_draw(self.game.guild_id, self.game.jugadores["X"], self.game.jugadores["O"])
+            await self.send_game_end(interaction, "😲 ¡Empate!")
             return True
         return False
 
-    def evaluate(self, board):
-        if self.game.modo_vs_bot and self.game.bot_marker:
-            bot_marker = self.game.bot_marker
-            human_marker = "X" if bot_marker == "O" else "O"
-        else:
-            bot_marker = "O"
-            human_marker = "X"
-        wins = [
-            (0, 1, 2), (3, 4, 5), (6, 7, 8),
-            (0, 3, 6), (1, 4, 7), (2, 5, 8),
-            (0, 4, 8), (2, 4, 6)
-        ]
-        for a, b, c in wins:
-            if board[a] == board[b] == board[c] and board[a] != " ":
-                if board[a] == bot_marker:
-                    return 10
-                elif board[a] == human_marker:
-                    return -10
-        return 0
-
-    def minimax(self, board, depth, is_maximizing, max_depth=3):
-        if depth >= max_depth:
-            return 0  # Detener la recursión en la profundidad máxima
-        if self.game.modo_vs_bot and self.game.bot_marker:
-            bot_marker = self.game.bot_marker
-            human_marker = "X" if bot_marker == "O" else "O"
-        else:
-            bot_marker = "O"
-            human_marker = "X"
-        score = self.evaluate(board)
-        if score == 10 or score == -10:
-            return score
-        if " " not in board:
-            return 0
-
-        if is_maximizing:
-            best = -1000
-            for i in range(9):
-                if board[i] == " ":
-                    board[i] = bot_marker
-                    best = max(best, self.minimax(board, depth + 1, False))
-                    board[i] = " "
-            return best
-        else:
-            best = 1000
-            for i in range(9):
-                if board[i] == " ":
-                    board[i] = human_marker
-                    best = min(best, self.minimax(board, depth + 1, True))
-                    board[i] = " "
-            return best
-
+    @cronometrado("bot_move")
     async def bot_move(self, interaction: discord.Interaction, first_turn=False):
-        if self.game.modo_vs_bot and self.game.bot_marker:
-            bot_marker = self.game.bot_marker
-            human_marker = "X" if bot_marker == "O" else "O"
-        else:
-            bot_marker = "O"
-            human_marker = "X"
-        board = self.game.tablero[:]
-        best_move = None
-        dificultad = self.game.dificultad.lower()
-        if dificultad == "facil":
-            if random.random() < 0.7:
-                available_moves = [i for i in range(9) if board[i] == " "]
-                best_move = random.choice(available_moves)
-            else:
-                best_score = -1000
-                for i in range(9):
-                    if board[i] == " ":
-                        board[i] = bot_marker
-                        score = self.minimax(board, 0, False)
-                        board[i] = " "
-                        if score > best_score:
-                            best_score = score
-                            best_move = i
-        elif dificultad == "medio":
-            if random.random() < 0.5:
-                available_moves = [i for i in range(9) if board[i] == " "]
-                best_move = random.choice(available_moves)
-            else:
-                best_score = -1000
-                for i in range(9):
-                    if board[i] == " ":
-                        board[i] = bot_marker
-                        score = self.minimax(board, 0, False)
-                        board[i] = " "
-                        if score > best_score:
-                            best_score = score
-                            best_move = i
-        else:
-            best_score = -1000
-            for i in range(9):
-                if board[i] == " ":
-                    board[i] = bot_marker
-                    score = self.minimax(board, 0, False)
-                    board[i] = " "
-                    if score > best_score:
-                        best_score = score
-                        best_move = i
-
-        if board == [" "] * 9:
-            best_move = 4 if board[4] == " " else random.choice([0, 2, 6, 8])
-        else:
-            pass
-
-        embed = discord.Embed(
-            title="🎲 ¡Tres en raya!",
-            description=(
-                f"{self.game.jugadores['X']} vs {self.game.jugadores['O']}\n\n"
-                f"🔄 Turno de {self.game.jugadores[bot_marker]} con {FICHAS[bot_marker]}!"
-            ),
-            color=discord.Color.blue()
-        )
-        await self.message.edit(embed=embed, view=self)
+        bot_marker, human_marker = self.game.fichas_bot()
+        # La búsqueda corre en otro proceso mientras transcurre la pausa del bot
+        calculo_jugada = asyncio.ensure_future(calculador.calcular(
+            self.message_id, self.game.variante.nombre, self.game.x, self.game.o,
+            bot_marker, self.game.dificultad.lower()
+        ))
 
-        if not first_turn:
-            await asyncio.sleep(0.3)
+        if not first_turn and BOT_RETARDO > 0:
+            await asyncio.sleep(BOT_RETARDO)
 
-        if best_move is not None:
-            self.game.tablero[best_move] = bot_marker
-            self.children[best_move].label = FICHAS[bot_marker]
-            self.children[best_move].style = self.get_button_style(bot_marker)
-            self.children[best_move].disabled = True
-            if await self.check_endgame(interaction):
-                return
+        best_move = await calculo_jugada
+        if best_move is None:
+            return  # Búsqueda cancelada: la partida se abandonó
+        self.game.marcar(best_move, bot_marker)
+        historial.registrar(self.message_id, self.game, best_move, bot_marker)
+        persistencia.tocar(self.message_id)
+        self.marcar_boton(best_move, bot_marker)
+        if await self.check_endgame(interaction):
+            return
         self.game.jugador_actual = human_marker
+        self.iniciar_reloj()
 
-        embed = discord.Embed(
-            title="🎲 ¡Tres en raya!",
-            description=(
-                f"{self.game.jugadores['X']} vs {self.game.jugadores['O']}\n\n"
-                f"🔄 Turno de {self.game.jugadores[self.game.jugador_actual]} con {FICHAS[self.game.jugador_actual]}!"
-            ),
-            color=discord.Color.blue()
-        )
-        await self.message.edit(embed=embed, view=self)
+        # Jugada del usuario, jugada del bot y turno siguiente en una sola edición
+        await self.update_message(interaction, embed=self.turn_embed())
 
+    @cronometrado("handle_click")
     async def handle_click(self, interaction: discord.Interaction, index: int):
+        if self.lock.locked():
+            # Otro clic o la jugada del bot están en curso: este clic se hizo
+            # sobre un tablero ya desactualizado y se confirma sin hacer nada
+            metricas.CLICS_DESCARTADOS.inc(motivo="ocupada")
+            await interaction.response.defer()
+            return
+        async with self.lock:
+            await self.procesar_click(interaction, index)
+
+    async def procesar_click(self, interaction: discord.Interaction, index: int):
+        partidas.tocar(self.message_id)
         if not self.game.partida_activa:
             await interaction.response.send_message(
                 "⚠️ No hay una partida en curso. Usa `/start` para jugar.",
@@ -384,39 +554,61 @@ class TicTacToeView(View):
             await interaction.response.send_message("⚠️ No es tu turno.", ephemeral=True)
             return
 
-        if self.game.tablero[index] != " ":
+        if not self.game.libre(index):
             await interaction.response.send_message("❌ Esa casilla ya está ocupada.", ephemeral=True)
             return
+        ficha = self.game.jugador_actual
 
-        self.game.tablero[index] = self.game.jugador_actual
-        self.children[index].label = FICHAS[self.game.jugador_actual]
-        self.children[index].style = self.get_button_style(self.game.jugador_actual)
-        self.children[index].disabled = True
+        if ediciones.saturado():
+            # Demasiadas ediciones en curso: mejor rechazar que encolar sin límite
+            await interaction.response.send_message(
+                "⏳ El bot está ocupado, vuelve a intentarlo en unos segundos.",
+                ephemeral=True
+            )
+            return
+        if self.game.modo_vs_bot:
+            motivo = admision.admitir_busqueda(calculador.en_vuelo())
+            if motivo is not None:
+                await avisar_rechazo(interaction, motivo)
+                return
+
+        self.game.jugar(index)
+        historial.registrar(self.message_id, self.game, index, ficha)
+        persistencia.tocar(self.message_id)
+        self.marcar_boton(index, ficha)
 
         if await self.check_endgame(interaction):
             return
 
         if self.game.modo_vs_bot:
             self.game.jugador_actual = self.game.bot_marker
-            await interaction.response.edit_message(view=self)
+            self.iniciar_reloj()
+            # Confirmar el clic sin editar; el tablero se actualiza tras la jugada del bot
+            await interaction.response.defer()
             await self.bot_move(interaction)
         else:
-            self.game.jugador_actual = "O" if self.game.jugador_actual == "X" else "X"
-            embed = discord.Embed(
-                title="🎲 ¡Tres en raya!",
-                description=(
-                    f"{self.game.jugadores['X']} vs {self.game.jugadores['O']}\n\n"
-                    f"🔄 Turno de {self.game.jugadores[self.game.jugador_actual]} con {FICHAS[self.game.jugador_actual]}!"
-                ),
-                color=discord.Color.blue()
-            )
-            await interaction.response.edit_message(embed=embed, view=self)
+            self.game.cambiar_turno()
+            self.iniciar_reloj()
+            await self.update_message(interaction, embed=self.turn_embed())
 
 class GameEndView(discord.ui.View):
     def __init__(self, game, original_channel):
-        super().__init__(timeout=180)
+        # El plazo lo lleva la rueda de temporizadores, no una tarea por vista
+        super().__init__(timeout=None)
         self.game = game
         self.original_channel = original_channel
+        self.message = None  # Respuesta con los botones de fin de partida
+        self.usada = False  # Reiniciar o Terminar ya pulsado
+        temporizadores.programar("vista", self, FIN_SEGUNDOS)
+
+    async def caducar(self):
+        """Desactiva los botones si nadie los pulsó a tiempo."""
+        self.stop()
+        if self.usada or self.message is None:
+            return
+        for child in self.children:
+            child.disabled = True
+        await ediciones.editar(self.message.id, self.message.edit, view=self)
 
     def es_jugador_actual(self, user):
         return user.mention in self.game.jugadores.values()
@@ -426,47 +618,65 @@ class GameEndView(discord.ui.View):
         if not self.es_jugador_actual(interaction.user):
             await interaction.response.send_message("❌ Solo los jugadores de esta partida pueden usar este botón.", ephemeral=True)
             return
+        if self.usada:
+            # Doble clic o ambos jugadores a la vez: solo cuenta el primero
+            metricas.CLICS_DESCARTADOS.inc(motivo="fin_usado")
+            await interaction.response.defer()
+            return
+        motivo = admitir_inicio(interaction)
+        if motivo is not None:
+            await avisar_rechazo(interaction, motivo)
+            return
+        self.usada = True
+        temporizadores.cancelar("vista", self)
 
         guild_id = self.game.guild_id
         dificultad = self.game.dificultad
         jugadores = self.game.jugadores
+        variante = self.game.variante.nombre
 
         await interaction.response.defer()
 
-        if bot.user.mention in jugadores.values():
-            user_ficha = "O" if jugadores["X"] == bot.user.mention else "X"
-            await reiniciar_partida(interaction, None, dificultad, user_ficha, jugadores=jugadores)
-        else:
-            user_ficha = "X" if interaction.user.mention == jugadores["X"] else "O"
-            oponente = interaction.guild.get_member(int(jugadores["X"].strip("<@!>"))) if user_ficha == "O" else interaction.guild.get_member(int(jugadores["O"].strip("<@!>")))
-            await reiniciar_partida(interaction, oponente, None, user_ficha, jugadores=jugadores)
+        # Sin timeout propio, la vista solo sale del registro de discord.py con stop()
+        try:
+            if bot.user.mention in jugadores.values():
+                user_ficha = "O" if jugadores["X"] == bot.user.mention else "X"
+                await reiniciar_partida(interaction, None, dificultad, user_ficha, jugadores=jugadores, variante=variante)
+            else:
+                user_ficha = "X" if interaction.user.mention == jugadores["X"] else "O"
+                oponente = interaction.guild.get_member(id_de_mencion(jugadores["X"])) if user_ficha == "O" else interaction.guild.get_member(id_de_mencion(jugadores["O"]))
+                await reiniciar_partida(interaction, oponente, None, user_ficha, jugadores=jugadores, variante=variante)
 
-        for child in self.children:
-            child.disabled = True
-        await interaction.edit_original_response(view=self)
+            for child in self.children:
+                child.disabled = True
+            await interaction.edit_original_response(view=self)
+        finally:
+            self.stop()
 
     @discord.ui.button(label="Terminar", style=discord.ButtonStyle.danger)
     async def terminar(self, interaction: discord.Interaction, button: discord.ui.Button):
         if not self.es_jugador_actual(interaction.user):
             await interaction.response.send_message("❌ Solo los jugadores de esta partida pueden usar este botón.", ephemeral=True)
             return
+        if self.usada:
+            # Doble clic o ambos jugadores a la vez: solo cuenta el primero
+            metricas.CLICS_DESCARTADOS.inc(motivo="fin_usado")
+            await interaction.response.defer()
+            return
+        self.usada = True
+        temporizadores.cancelar("vista", self)
 
         await interaction.response.defer()
 
         for child in self.children:
             child.disabled = True
 
-        embed = discord.Embed(
-            title="Juego terminado",
-            description="La partida se ha terminado.",
-            color=discord.Color.purple()
-        )
-        await interaction.message.edit(embed=embed, view=self)
+        await interaction.message.edit(embed=render.EMBED_TERMINADA, view=self)
         self.stop()
 
 # Función auxiliar para reiniciar la partida usando la configuración anterior
-async def reiniciar_partida(interaction: discord.Interaction, oponente: discord.Member, dificultad: str, user_ficha: str, *, jugadores=None):
-    game = TicTacToeGame(interaction.guild.id, dificultad=dificultad if dificultad else "medio")
+async def reiniciar_partida(interaction: discord.Interaction, oponente: discord.Member, dificultad: str, user_ficha: str, *, jugadores=None, variante="3x3"):
+    game = TicTacToeGame(interaction.guild.id, dificultad=dificultad if dificultad else "medio", variante=variante)
     game.partida_activa = True
     if jugadores:
         game.jugadores = jugadores
@@ -490,35 +700,51 @@ async def reiniciar_partida(interaction: discord.Interaction, oponente: discord.
     game.jugador_actual = "X"
 
     view = TicTacToeView(game, interaction.id)
-    embed = discord.Embed(
-        title="🎲 ¡Tres en raya!",
-        description=(
-            f"{game.jugadores['X']} vs {game.jugadores['O']}\n\n"
-            "🎮 ¡QUE COMIENCE EL JUEGO! 🎮\n\n"
-            f"🔄 Turno de {game.jugadores[game.jugador_actual]} con {FICHAS[game.jugador_actual]}!"
-        ),
-        color=discord.Color.blue()
-    )
+    embed = view.turn_embed(inicio=True)
     message = await interaction.channel.send(embed=embed, view=view)
     partidas[interaction.id] = game
-    save_partidas()
+    vistas[interaction.id] = view
+    persistencia.guardar(interaction.id, game)
     view.message = message
+    view.iniciar_reloj()
     if game.modo_vs_bot and ((user_ficha == "O") or (user_ficha == "X" and game.bot_marker == "X")):
-        await view.bot_move(interaction, first_turn=True)
+        async with view.lock:
+            await view.bot_move(interaction, first_turn=True)
 
 # Vista para la selección de ficha
 class TokenSelectionView(discord.ui.View):
-    def __init__(self, original_interaction: discord.Interaction, oponente: discord.Member, dificultad: str):
-        super().__init__(timeout=60)
+    def __init__(self, original_interaction: discord.Interaction, oponente: discord.Member, dificultad: str, variante: str = "3x3"):
+        super().__init__(timeout=None)
         self.original_interaction = original_interaction
         self.oponente = oponente
         self.dificultad = dificultad
+        self.variante = variante
+        self.usada = False  # Ficha ya elegida
+        temporizadores.programar("vista", self, FICHA_SEGUNDOS)
+
+    async def caducar(self):
+        """Desactiva la selección si no se eligió ficha a tiempo."""
+        self.stop()
+        if self.usada:
+            return
+        for child in self.children:
+            child.disabled = True
+        await ediciones.editar(
+            self.original_interaction.id, self.original_interaction.edit_original_response, view=self
+        )
 
     @discord.ui.button(label="❎", style=discord.ButtonStyle.success)
     async def select_x(self, interaction: discord.Interaction, button: discord.ui.Button):
         if interaction.user.id != self.original_interaction.user.id:
             await interaction.response.send_message("No puedes seleccionar esta opción.", ephemeral=True)
             return
+        if self.usada:
+            # Solo la primera ficha elegida inicia la partida
+            metricas.CLICS_DESCARTADOS.inc(motivo="ficha_elegida")
+            await interaction.response.defer(ephemeral=True)
+            return
+        self.usada = True
+        temporizadores.cancelar("vista", self)
         await interaction.response.defer(ephemeral=True)
         for child in self.children:
             child.disabled = True
@@ -528,7 +754,7 @@ class TokenSelectionView(discord.ui.View):
             await interaction.edit_original_response(view=self)
         except Exception as e:
             print("Error al editar el mensaje:", e)
-        await iniciar_partida(self.original_interaction, self.oponente, self.dificultad, "X")
+        await iniciar_partida(self.original_interaction, self.oponente, self.dificultad, "X", variante=self.variante)
         self.stop()
 
     @discord.ui.button(label="🅾️", style=discord.ButtonStyle.danger)
@@ -536,6 +762,13 @@ class TokenSelectionView(discord.ui.View):
         if interaction.user.id != self.original_interaction.user.id:
             await interaction.response.send_message("No puedes seleccionar esta opción.", ephemeral=True)
             return
+        if self.usada:
+            # Solo la primera ficha elegida inicia la partida
+            metricas.CLICS_DESCARTADOS.inc(motivo="ficha_elegida")
+            await interaction.response.defer(ephemeral=True)
+            return
+        self.usada = True
+        temporizadores.cancelar("vista", self)
         await interaction.response.defer(ephemeral=True)
         for child in self.children:
             child.disabled = True
@@ -545,20 +778,20 @@ class TokenSelectionView(discord.ui.View):
             await interaction.edit_original_response(view=self)
         except Exception as e:
             print("Error al editar el mensaje:", e)
-        await iniciar_partida(self.original_interaction, self.oponente, self.dificultad, "O", bot_first=True)
+        await iniciar_partida(self.original_interaction, self.oponente, self.dificultad, "O", bot_first=True, variante=self.variante)
         self.stop()
 
 # Función para iniciar la partida según la ficha seleccionada
-async def iniciar_partida(interaction: discord.Interaction, oponente: discord.Member, dificultad: str, user_ficha: str, bot_first: bool = False):
+async def iniciar_partida(interaction: discord.Interaction, oponente: discord.Member, dificultad: str, user_ficha: str, bot_first: bool = False, variante: str = "3x3"):
     if oponente is not None and oponente.id != bot.user.id:
-        game = TicTacToeGame(interaction.guild.id)
+        game = TicTacToeGame(interaction.guild.id, variante=variante)
         if user_ficha == "X":
             game.jugadores = {"X": interaction.user.mention, "O": oponente.mention}
         else:
             game.jugadores = {"X": oponente.mention, "O": interaction.user.mention}
     else:
         dificultad = dificultad if dificultad else "medio"
-        game = TicTacToeGame(interaction.guild.id, dificultad=dificultad)
+        game = TicTacToeGame(interaction.guild.id, dificultad=dificultad, variante=variante)
         game.modo_vs_bot = True
         if user_ficha == "X":
             game.jugadores = {"X": interaction.user.mention, "O": bot.user.mention}
@@ -571,39 +804,45 @@ async def iniciar_partida(interaction: discord.Interaction, oponente: discord.Me
     game.partida_activa = True
 
     view = TicTacToeView(game, interaction.id)
-    embed = discord.Embed(
-        title="🎲 ¡Tres en raya!",
-        description=(
-            f"{game.jugadores['X']} vs {game.jugadores['O']}\n\n"
-            "🎮 ¡QUE COMIENCE EL JUEGO! 🎮\n\n"
-            f"🔄 Turno de {game.jugadores[game.jugador_actual]} con {FICHAS[game.jugador_actual]}!"
-        ),
-        color=discord.Color.blue()
-    )
+    embed = view.turn_embed(inicio=True)
     message = await interaction.followup.send(embed=embed, view=view)
     partidas[interaction.id] = game
-    save_partidas()
+    vistas[interaction.id] = view
+    persistencia.guardar(interaction.id, game)
     view.message = message
+    view.iniciar_reloj()
     if bot_first and game.modo_vs_bot:
-        await view.bot_move(interaction, first_turn=True)
+        async with view.lock:
+            await view.bot_move(interaction, first_turn=True)
 
 @bot.tree.command(name="start", description="Inicia una partida de Tres en Raya.")
 @app_commands.describe(
     oponente="Menciona un oponente para jugar contra él, o déjalo vacío para jugar contra el bot.",
-    dificultad="Selecciona la dificultad (solo disponible contra el bot)."
+    dificultad="Selecciona la dificultad (solo disponible contra el bot).",
+    variante="Tamaño del tablero: 3x3 (3 en raya), 4x4 (4 en raya) o 5x5 (4 en raya)."
 )
 @app_commands.choices(
     dificultad=[
         app_commands.Choice(name="Fácil", value="facil"),
         app_commands.Choice(name="Medio", value="medio"),
         app_commands.Choice(name="Difícil", value="dificil")
+    ],
+    variante=[
+        app_commands.Choice(name="3x3", value="3x3"),
+        app_commands.Choice(name="4x4 (4 en raya)", value="4x4"),
+        app_commands.Choice(name="5x5 (4 en raya)", value="5x5")
     ]
 )
 async def start(
     interaction: discord.Interaction, 
     oponente: discord.Member = None, 
-    dificultad: app_commands.Choice[str] = None
+    dificultad: app_commands.Choice[str] = None,
+    variante: app_commands.Choice[str] = None
 ):
+    motivo = admitir_inicio(interaction)
+    if motivo is not None:
+        await avisar_rechazo(interaction, motivo)
+        return
     if oponente is not None and oponente.id != bot.user.id:
         if dificultad is not None:
             await interaction.response.send_message(
@@ -614,7 +853,8 @@ async def start(
         dificultad_value = None
     else:
         dificultad_value = dificultad.value if dificultad else "medio"
-    view = TokenSelectionView(interaction, oponente, dificultad_value)
+    variante_value = variante.value if variante else "3x3"
+    view = TokenSelectionView(interaction, oponente, dificultad_value, variante_value)
     embed = discord.Embed(
         title="🎲 ¡Tres en raya!",
         description="Selecciona tu ficha:",
@@ -625,59 +865,87 @@ async def start(
 @bot.tree.command(name="stats", description="Muestra las estadísticas de tus partidas o las de otro usuario")
 @app_commands.describe(usuario="Menciona a un usuario para ver sus estadísticas")
 async def stats_command(interaction: discord.Interaction, usuario: discord.Member = None):
-    await interaction.response.defer()
+    if await aviso_arranque(interaction, "estadisticas"):
+        return
     guild_id = interaction.guild.id
-    user = usuario.mention if usuario else interaction.user.mention
+    user = usuario.id if usuario else interaction.user.id
     user_display_name = usuario.display_name if usuario else interaction.user.display_name
-    cursor.execute("SELECT wins, losses, draws FROM stats WHERE guild_id = %s AND user = %s", (guild_id, user))
-    result = cursor.fetchone()
-    if result:
-        wins, losses, draws = result
-    else:
-        wins, losses, draws = 0, 0, 0
+    wins, losses, draws = estadisticas.obtener(guild_id, user)
     embed = discord.Embed(
         title=f"📊 Estadísticas de {user_display_name}",
         description=f"Victorias: {wins}\nDerrotas: {losses}\nEmpates: {draws}",
         color=discord.Color.green()
     )
-    await interaction.followup.send(embed=embed)
+    await interaction.response.send_message(embed=embed)
+
+TITULOS_PERIODO = {
+    None: "🏆 Tabla de posiciones:",
+    "semana": "🏆 Tabla de posiciones de los últimos 7 días:",
+    "mes": "🏆 Tabla de posiciones de los últimos 30 días:",
+}
 
 @bot.tree.command(name="leaderboard", description="Muestra el top de jugadores con más victorias.")
-async def leaderboard(interaction: discord.Interaction):
-    await interaction.response.defer()
+@app_commands.describe(
+    pagina="Página de la tabla de posiciones (por defecto la primera).",
+    periodo="Solo las partidas de la última semana o del último mes (por defecto todas)."
+)
+@app_commands.choices(
+    periodo=[
+        app_commands.Choice(name="Histórico", value="total"),
+        app_commands.Choice(name="Últimos 7 días", value="semana"),
+        app_commands.Choice(name="Últimos 30 días", value="mes")
+    ]
+)
+async def leaderboard(
+    interaction: discord.Interaction,
+    pagina: app_commands.Range[int, 1] = 1,
+    periodo: app_commands.Choice[str] = None
+):
+    if await aviso_arranque(interaction, "estadisticas"):
+        return
     guild_id = interaction.guild.id
-    cursor.execute("""
-        SELECT user, wins, losses FROM stats
-        WHERE guild_id = %s
-        ORDER BY wins DESC, losses ASC
-        LIMIT 100
-    """, (guild_id,))
-    results = cursor.fetchall()
-    if not results:
-        await interaction.followup.send("⚠️ No hay datos disponibles para mostrar la tabla de posiciones.")
+    periodo_value = periodo.value if periodo and periodo.value != "total" else None
+    total = estadisticas.total(guild_id, periodo_value)
+    if not total:
+        await interaction.response.send_message("⚠️ No hay datos disponibles para mostrar la tabla de posiciones.")
         return
-    leaderboard_text = ""
-    excluded_user_id = 1334910035054297131  # ID del usuario "La Vieja" a excluir
-    position = 1
-    previous_wins, previous_losses = None, None
-    for user_mention, wins, losses in results:
-        try:
-            user_id = int(user_mention.strip("<@!>"))
-        except Exception:
-            continue
-        if user_id == excluded_user_id:
-            continue
-        # Ajustar posición solo si el puntaje cambia
-        if (wins, losses) != (previous_wins, previous_losses):
-            position = leaderboard_text.count("\n") + 1
-        leaderboard_text += f"**#{position}** - {wins} Pts. <@{user_id}>\n"
-        previous_wins, previous_losses = wins, losses
+    paginas = (total + TAMANO_PAGINA - 1) // TAMANO_PAGINA
+    pagina = min(pagina, paginas)
+    results = estadisticas.pagina(guild_id, (pagina - 1) * TAMANO_PAGINA, TAMANO_PAGINA, periodo_value)
+    lineas = []
+    for position, user_id, wins, losses in results:
+        lineas.append(f"**#{position}** - {wins} Pts. <@{user_id}>")
+    embed = discord.Embed(
+        title=TITULOS_PERIODO[periodo_value],
+        description="\n".join(lineas),
+        color=discord.Color.gold()
+    )
+    embed.set_footer(text=f"Página {pagina} de {paginas}")
+    await interaction.response.send_message(embed=embed)
+
+@bot.tree.command(name="rank", description="Muestra tu posición en la tabla o la de otro usuario.")
+@app_commands.describe(usuario="Menciona a un usuario para ver su posición")
+async def rank(interaction: discord.Interaction, usuario: discord.Member = None):
+    if await aviso_arranque(interaction, "estadisticas"):
+        return
+    guild_id = interaction.guild.id
+    user = usuario.id if usuario else interaction.user.id
+    user_display_name = usuario.display_name if usuario else interaction.user.display_name
+    resultado = estadisticas.posicion(guild_id, user)
+    if resultado is None:
+        await interaction.response.send_message(
+            f"⚠️ {user_display_name} aún no aparece en la tabla de posiciones.",
+            ephemeral=True
+        )
+        return
+    position, total = resultado
+    wins, losses, draws = estadisticas.obtener(guild_id, user)
     embed = discord.Embed(
-        title="🏆 Tabla de posiciones:",
-        description=leaderboard_text,
+        title=f"🏅 Posición de {user_display_name}",
+        description=f"**#{position}** de {total}\nVictorias: {wins}\nDerrotas: {losses}\nEmpates: {draws}",
         color=discord.Color.gold()
     )
-    await interaction.followup.send(embed=embed)
+    await interaction.response.send_message(embed=embed)
 
 @bot.tree.command(name="help", description="Muestra información sobre los comandos del bot.")
 async def help_command(interaction: discord.Interaction):
@@ -687,9 +955,14 @@ async def help_command(interaction: discord.Interaction):
             "`/start` - Inicia una partida de Tres en Raya.\n"
             "`/start |oponente|` - Inicia una partida contra otro usuario.\n"
             "`/start |dificultad|` - Define la dificultad contra el bot.\n"
+            "`/start |variante|` - Elige el tablero: 3x3, 4x4 o 5x5.\n"
             "\n`/stats` - Muestra tus estadísticas.\n"
             "`/stats |usuario|` - Muestra las estadísticas de otro usuario.\n"
             "\n`/leaderboard` - Tabla de posiciones.\n"
+            "`/leaderboard |pagina|` - Otra página de la tabla de posiciones.\n"
+            "`/leaderboard |periodo|` - Tabla de la última semana o del último mes.\n"
+            "`/rank` - Tu posición en la tabla.\n"
+            "`/rank |usuario|` - La posición de otro usuario.\n"
             "\n`/help` - Este mensaje de ayuda."
         ),
         color=discord.Color.blue()
@@ -698,12 +971,10 @@ async def help_command(interaction: discord.Interaction):
 
 @bot.event
 async def on_ready():
-    load_partidas()
-    load_stats()
-    await bot.tree.sync()
-    print(f"Bot conectado como {bot.user}")
+    # Se repite en cada reconexión: la carga inicial se hace en setup_hook
+    print(f"Bot conectado como {bot.user} (shards {sorted(bot.shards)} de {bot.shard_count})")
     activity = discord.Game(name="La Vieja ❎🅾️")
     await bot.change_presence(activity=activity)
 
-webserver.keep_alive()
-bot.run(TOKEN)
\ No newline at end of file
+if __name__ == "__main__":
+    bot.run(TOKEN)
\ No newline at end of file
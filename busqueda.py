@@ -0,0 +1,293 @@
+import random
+import time
+
+import libro
+import solver
+from simetria import SIMETRIAS
+from tablero import VARIANTES
+
+# Motor de búsqueda para tableros de n x n con k en raya.
+# Negamax con poda alfa-beta, tabla de transposición indexada por hash de
+# Zobrist (tamaño fijo, reemplazo por profundidad y generación), ordenación de
+# jugadas (jugada de la tabla, heurística de historia y casillas centrales) y
+# profundización iterativa con un presupuesto de tiempo por jugada.
+#
+# La tabla de transposición se indexa por la forma canónica de la posición:
+# se mantienen a la vez los hashes de las 8 imágenes simétricas del tablero y
+# la clave es el menor. La jugada guardada está en el marco de esa imagen.
+
+GANA = 1_000_000
+MARGEN_VICTORIA = 1_000  # Valores por encima de GANA - MARGEN son victorias forzadas
+
+EXACTO, COTA_INFERIOR, COTA_SUPERIOR = 0, 1, 2
+
+CEROS = (0,) * 8  # Hashes simétricos del tablero vacío
+
+# Presupuesto de búsqueda de cada dificultad
+NIVELES = {
+    "facil": {"profundidad": 1, "tiempo": 0.05},
+    "medio": {"profundidad": 3, "tiempo": 0.25},
+    "dificil": {"profundidad": None, "tiempo": 1.0},
+}
+
+
+class TiempoAgotado(Exception):
+    pass
+
+
+class TablaTransposicion:
+    """Tabla de tamaño fijo indexada por los bits bajos del hash."""
+
+    def __init__(self, bits=16):
+        self.mascara = (1 << bits) - 1
+        self.entradas = [None] * (1 << bits)
+        self.generacion = 0
+
+    def nueva_busqueda(self):
+        # Las entradas de búsquedas anteriores pasan a ser reemplazables
+        self.generacion += 1
+
+    def buscar(self, clave):
+        entrada = self.entradas[clave & self.mascara]
+        if entrada is not None and entrada[0] == clave:
+            return entrada
+        return None
+
+    def guardar(self, clave, profundidad, valor, tipo, jugada):
+        indice = clave & self.mascara
+        entrada = self.entradas[indice]
+        if (entrada is None or entrada[5] != self.generacion
+                or entrada[0] == clave or profundidad >= entrada[1]):
+            self.entradas[indice] = (clave, profundidad, valor, tipo, jugada, self.generacion)
+
+
+class Motor:
+    def __init__(self, variante, bits_tt=16, semilla=0x5EED):
+        self.variante = variante
+        rng = random.Random(semilla)
+        # Un número aleatorio de 64 bits por casilla y ficha (0: X, 1: O)
+        self.zobrist = tuple(
+            tuple(rng.getrandbits(64) for _ in range(variante.total))
+            for _ in range(2)
+        )
+        self.simetrias = SIMETRIAS[variante.nombre]
+        # zobrist_simetrico[color][i][t]: número de la casilla i vista desde la imagen t
+        self.zobrist_simetrico = tuple(
+            tuple(
+                tuple(numeros[p[i]] for p in self.simetrias.permutaciones)
+                for i in range(variante.total)
+            )
+            for numeros in self.zobrist
+        )
+        self.tt = TablaTransposicion(bits_tt)
+        self.historia = [0] * variante.total
+        # Peso de una línea según cuántas fichas de un solo jugador contiene
+        self.pesos = tuple(0 if c == 0 else 10 ** (c - 1) for c in range(variante.k + 1))
+        # Orden estático: primero las casillas que participan en más líneas
+        participacion = [
+            sum(1 for linea in variante.lineas if linea & casilla)
+            for casilla in variante.casillas
+        ]
+        self.orden = sorted(range(variante.total), key=lambda i: -participacion[i])
+        self.nodos = 0
+        self._limite = None
+
+    def hashes(self, x, o):
+        """Hashes de las 8 imágenes simétricas de la posición."""
+        hs = CEROS
+        for numeros, bits in zip(self.zobrist_simetrico, (x, o)):
+            while bits:
+                i = (bits & -bits).bit_length() - 1
+                hs = tuple(map(int.__xor__, hs, numeros[i]))
+                bits &= bits - 1
+        return hs
+
+    def evaluar(self, propio, rival):
+        """Heurística desde el punto de vista del jugador que mueve."""
+        valor = 0
+        pesos = self.pesos
+        for linea in self.variante.lineas:
+            a = linea & propio
+            b = linea & rival
+            if not b:
+                valor += pesos[a.bit_count()]
+            elif not a:
+                valor -= pesos[b.bit_count()]
+        return valor
+
+    def _ordenar(self, ocupadas, jugada_tt):
+        casillas = self.variante.casillas
+        jugadas = [i for i in self.orden if not ocupadas & casillas[i]]
+        historia = self.historia
+        jugadas.sort(key=lambda i: -historia[i])
+        if jugada_tt is not None and jugada_tt in jugadas:
+            jugadas.remove(jugada_tt)
+            jugadas.insert(0, jugada_tt)
+        return jugadas
+
+    def _negamax(self, propio, rival, hs, color, profundidad, alfa, beta, ply):
+        self.nodos += 1
+        if self._limite is not None and not self.nodos & 1023 and time.perf_counter() > self._limite:
+            raise TiempoAgotado()
+        variante = self.variante
+        if variante.hay_linea(rival):
+            return -(GANA - ply)  # El rival acaba de ganar
+        ocupadas = propio | rival
+        if ocupadas == variante.lleno:
+            return 0
+        if profundidad == 0:
+            return self.evaluar(propio, rival)
+
+        alfa_original = alfa
+        jugada_tt = None
+        h = min(hs)
+        t = hs.index(h)
+        simetrias = self.simetrias
+        entrada = self.tt.buscar(h)
+        if entrada is not None:
+            if entrada[4] is not None:
+                jugada_tt = simetrias.deshacer(t, entrada[4])
+            if entrada[1] >= profundidad:
+                valor = _desde_tabla(entrada[2], ply)
+                if entrada[3] == EXACTO:
+                    return valor
+                if entrada[3] == COTA_INFERIOR:
+                    alfa = max(alfa, valor)
+                else:
+                    beta = min(beta, valor)
+                if alfa >= beta:
+                    return valor
+
+        mejor = -GANA - 1
+        mejor_jugada = None
+        casillas = variante.casillas
+        zobrist = self.zobrist_simetrico[color]
+        for i in self._ordenar(ocupadas, jugada_tt):
+            # Las hojas no consultan la tabla: no necesitan sus hashes
+            hijo = tuple(map(int.__xor__, hs, zobrist[i])) if profundidad > 1 else None
+            valor = -self._negamax(
+                rival, propio | casillas[i], hijo, 1 - color,
+                profundidad - 1, -beta, -alfa, ply + 1
+            )
+            if valor > mejor:
+                mejor = valor
+                mejor_jugada = i
+            if valor > alfa:
+                alfa = valor
+            if alfa >= beta:
+                self.historia[i] += profundidad * profundidad
+                break
+
+        if mejor <= alfa_original:
+            tipo = COTA_SUPERIOR
+        elif mejor >= beta:
+            tipo = COTA_INFERIOR
+        else:
+            tipo = EXACTO
+        if mejor_jugada is not None:
+            mejor_jugada = simetrias.casilla(t, mejor_jugada)
+        self.tt.guardar(h, profundidad, _a_tabla(mejor, ply), tipo, mejor_jugada)
+        return mejor
+
+    def buscar(self, x, o, ficha, profundidad=None, tiempo=None):
+        """Devuelve (jugada, valor, nodos) para la ficha que mueve."""
+        variante = self.variante
+        propio, rival = (x, o) if ficha == "X" else (o, x)
+        color = 0 if ficha == "X" else 1
+        hs = self.hashes(x, o)
+        raiz = variante.libres(x, o)
+        if not raiz:
+            return None, 0, 0
+        # Desempate aleatorio entre jugadas de igual orden estático
+        random.shuffle(raiz)
+        posicion = {i: n for n, i in enumerate(self.orden)}
+        raiz.sort(key=lambda i: posicion[i])
+
+        profundidad = min(profundidad or len(raiz), len(raiz))
+        self.nodos = 0
+        self.historia = [v // 2 for v in self.historia]
+        self.tt.nueva_busqueda()
+        self._limite = time.perf_counter() + tiempo if tiempo else None
+        mejor_jugada, mejor_valor = raiz[0], 0
+        try:
+            for p in range(1, profundidad + 1):
+                alfa, beta = -GANA - 1, GANA + 1
+                valor_iteracion, jugada_iteracion = -GANA - 1, raiz[0]
+                for i in raiz:
+                    hijo = tuple(map(int.__xor__, hs, self.zobrist_simetrico[color][i])) if p > 1 else None
+                    valor = -self._negamax(
+                        rival, propio | variante.casillas[i], hijo,
+                        1 - color, p - 1, -beta, -alfa, 1
+                    )
+                    if valor > valor_iteracion:
+                        valor_iteracion, jugada_iteracion = valor, i
+                    alfa = max(alfa, valor)
+                # Iteración completa: se adopta su resultado
+                mejor_jugada, mejor_valor = jugada_iteracion, valor_iteracion
+                raiz.remove(mejor_jugada)
+                raiz.insert(0, mejor_jugada)
+                if abs(mejor_valor) >= GANA - MARGEN_VICTORIA:
+                    break  # Resultado forzado, no hace falta profundizar
+        except TiempoAgotado:
+            pass
+        finally:
+            self._limite = None
+        return mejor_jugada, mejor_valor, self.nodos
+
+
+def _a_tabla(valor, ply):
+    # Las victorias se guardan relativas a la posición, no a la raíz
+    if valor >= GANA - MARGEN_VICTORIA:
+        return valor + ply
+    if valor <= -(GANA - MARGEN_VICTORIA):
+        return valor - ply
+    return valor
+
+
+def _desde_tabla(valor, ply):
+    if valor >= GANA - MARGEN_VICTORIA:
+        return valor - ply
+    if valor <= -(GANA - MARGEN_VICTORIA):
+        return valor + ply
+    return valor
+
+
+MOTORES = {}
+
+
+def motor(nombre_variante):
+    """Motor compartido por todas las partidas de una variante."""
+    if nombre_variante not in MOTORES:
+        MOTORES[nombre_variante] = Motor(VARIANTES[nombre_variante])
+    return MOTORES[nombre_variante]
+
+
+def jugadas_de_libro(nombre_variante, x, o, dificultad):
+    """Jugadas del libro de aperturas que puede usar la dificultad, o None."""
+    # La apertura es para todos; las respuestas del libro, solo para el difícil
+    if x | o and dificultad != "dificil":
+        return None
+    return libro.consultar(nombre_variante, x, o)
+
+
+def jugada_inmediata(nombre_variante, x, o, dificultad):
+    """(jugada, 0) si sale de una tabla sin buscar, o None si hace falta buscar."""
+    jugadas = jugadas_de_libro(nombre_variante, x, o, dificultad)
+    if jugadas:
+        return random.choice(jugadas), 0
+    if not x | o:
+        return random.choice(VARIANTES[nombre_variante].centro), 0
+    if nombre_variante == "3x3" and dificultad == "dificil":
+        # Juego perfecto: consulta en la tabla precalculada
+        return solver.mejor_jugada(x, o), 0
+    return None
+
+
+def elegir_jugada(nombre_variante, x, o, ficha, dificultad):
+    """Jugada del bot según la variante y la dificultad, y nodos explorados."""
+    inmediata = jugada_inmediata(nombre_variante, x, o, dificultad)
+    if inmediata is not None:
+        return inmediata
+    nivel = NIVELES.get(dificultad, NIVELES["medio"])
+    jugada, _, nodos = motor(nombre_variante).buscar(x, o, ficha, **nivel)
+    return jugada, nodos
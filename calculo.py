@@ -0,0 +1,130 @@
+import asyncio
+import multiprocessing
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import busqueda
+from metricas import NODOS_BUSQUEDA
+from tablero import VARIANTES
+
+# Cálculo de las jugadas del bot fuera del event loop.
+# Las búsquedas se envían a un ProcessPoolExecutor, de modo que ni los
+# tableros grandes ni las búsquedas profundas frenan los heartbeats de Discord
+# ni las interacciones de otros servidores. Cada partida tiene como mucho una
+# búsqueda pendiente, que se puede cancelar si la partida se abandona.
+#
+# Las búsquedas esperan turno en el event loop y solo se envían al pool
+# cuando hay un proceso libre: así el tiempo límite empieza a contar cuando
+# un proceso la toma, y una partida abandonada mientras espera no llega a
+# ocupar ningún proceso.
+#
+# Los procesos se crean con forkserver y no con fork: el pool arranca con el
+# event loop, el servidor HTTP y los hilos de MySQL ya en marcha, y un fork
+# copiaría ese estado a medias. Por eso los puntos de entrada necesitan la
+# guarda if __name__ == "__main__".
+
+
+class CalculadorJugadas:
+    def __init__(self, procesos=None, timeout=5.0):
+        self.procesos = procesos  # None: tantos procesos como CPUs
+        self.timeout = timeout  # Segundos máximos de espera por jugada
+        self._executor = None
+        self._pendientes = {}  # message_id -> futuro de la búsqueda en curso o de su espera
+        self._libres = None  # Semáforo con los procesos libres del pool
+
+    def _procesos(self):
+        return self.procesos or os.cpu_count() or 1
+
+    def iniciar(self):
+        if self._libres is None:
+            self._libres = asyncio.Semaphore(self._procesos())
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.procesos, mp_context=multiprocessing.get_context("forkserver")
+            )
+
+    async def calentar(self):
+        """Arranca los procesos del pool antes de la primera jugada."""
+        self.iniciar()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(self._executor, busqueda.elegir_jugada, "3x3", 0, 0, "X", "facil")
+            for _ in range(self._procesos())
+        ))
+
+    async def calcular(self, message_id, variante, x, o, ficha, dificultad):
+        """Devuelve la jugada del bot, o None si la búsqueda se canceló."""
+        # Las consultas a tablas no compensa enviarlas a otro proceso
+        inmediata = busqueda.jugada_inmediata(variante, x, o, dificultad)
+        if inmediata is not None:
+            jugada, _ = inmediata
+            return jugada
+        self.iniciar()
+        self.cancelar(message_id)
+        if not await self._esperar_proceso(message_id):
+            return None  # La partida se abandonó mientras esperaba
+        loop = asyncio.get_running_loop()
+        futuro = loop.run_in_executor(
+            self._executor, busqueda.elegir_jugada, variante, x, o, ficha, dificultad
+        )
+        # El proceso queda ocupado hasta que la búsqueda termina, aunque ya no se espere
+        futuro.add_done_callback(lambda _: self._libres.release())
+        self._pendientes[message_id] = futuro
+        try:
+            jugada, nodos = await asyncio.wait_for(asyncio.shield(futuro), self.timeout)
+            NODOS_BUSQUEDA.observar(nodos, variante=variante, dificultad=dificultad)
+            return jugada
+        except asyncio.TimeoutError:
+            # La búsqueda no terminó a tiempo: se descarta y se juega al azar
+            futuro.cancel()
+            print(f"Búsqueda de la partida {message_id} agotó el tiempo")
+            return random.choice(VARIANTES[variante].libres(x, o))
+        except asyncio.CancelledError:
+            if futuro.cancelled():
+                return None  # La partida se abandonó mientras se buscaba
+            futuro.cancel()
+            raise
+        finally:
+            if self._pendientes.get(message_id) is futuro:
+                del self._pendientes[message_id]
+
+    async def _esperar_proceso(self, message_id):
+        """Espera un proceso libre; False si la búsqueda se canceló mientras tanto."""
+        espera = asyncio.ensure_future(self._libres.acquire())
+        self._pendientes[message_id] = espera
+        try:
+            await asyncio.shield(espera)
+            return True
+        except asyncio.CancelledError:
+            if espera.cancelled():
+                return False
+            if not espera.cancel() and espera.exception() is None:
+                self._libres.release()  # El proceso llegó a asignarse
+            raise
+        finally:
+            if self._pendientes.get(message_id) is espera:
+                del self._pendientes[message_id]
+
+    def capacidad(self):
+        """Búsquedas que el pool puede atender a la vez sin pasarse del tiempo límite."""
+        por_busqueda = max(nivel["tiempo"] for nivel in busqueda.NIVELES.values())
+        return self._procesos() * max(1, int(self.timeout // por_busqueda))
+
+    def en_vuelo(self):
+        """Búsquedas en espera de un proceso o en curso en el pool."""
+        return len(self._pendientes)
+
+    def cancelar(self, message_id):
+        """Cancela la búsqueda pendiente de una partida, si la hay."""
+        futuro = self._pendientes.pop(message_id, None)
+        if futuro is not None:
+            futuro.cancel()
+
+    def cerrar(self):
+        for futuro in self._pendientes.values():
+            futuro.cancel()
+        self._pendientes.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
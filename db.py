@@ -0,0 +1,120 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mysql.connector import errors, pooling
+
+from metricas import DB_CONSULTAS, DB_SEGUNDOS
+
+# Acceso asíncrono a MySQL.
+# Las consultas se ejecutan en un ThreadPoolExecutor del mismo tamaño que el
+# pool de conexiones, así el event loop nunca espera a la base de datos y
+# nunca hay más consultas simultáneas que conexiones disponibles.
+
+ERRORES_CONEXION = (errors.OperationalError, errors.InterfaceError)
+
+
+class BaseDeDatos:
+    def __init__(self, tamano=5, timeout=10, reintentos=2, **config):
+        self.config = config  # host, user, password, database...
+        self.tamano = tamano  # Conexiones máximas en el pool
+        self.timeout = timeout  # Segundos máximos por consulta
+        self.reintentos = reintentos  # Reintentos tras perder la conexión
+        self._pool = None
+        self._executor = ThreadPoolExecutor(max_workers=tamano, thread_name_prefix="mysql")
+
+    def _obtener_pool(self):
+        # El pool se crea en el primer uso, desde un hilo del executor
+        if self._pool is None:
+            self._pool = pooling.MySQLConnectionPool(
+                pool_name="lavieja",
+                pool_size=self.tamano,
+                read_timeout=int(self.timeout),
+                write_timeout=int(self.timeout),
+                **self.config
+            )
+        return self._pool
+
+    def _ejecutar(self, funcion):
+        """Ejecuta funcion(cursor) en una conexión del pool y confirma la transacción."""
+        for intento in range(self.reintentos + 1):
+            conexion = None
+            try:
+                # get_connection reconecta las conexiones caídas del pool
+                conexion = self._obtener_pool().get_connection()
+                cursor = conexion.cursor()
+                try:
+                    resultado = funcion(cursor)
+                    conexion.commit()
+                    return resultado
+                except Exception:
+                    if conexion.is_connected():
+                        conexion.rollback()
+                    raise
+                finally:
+                    cursor.close()
+            except ERRORES_CONEXION:
+                if intento == self.reintentos:
+                    raise
+                time.sleep(0.2 * (intento + 1))
+            finally:
+                if conexion is not None:
+                    conexion.close()  # Devuelve la conexión al pool
+
+    async def transaccion(self, funcion, timeout=None):
+        """Ejecuta funcion(cursor) fuera del event loop dentro de una transacción."""
+        loop = asyncio.get_running_loop()
+        with DB_SEGUNDOS.tiempo():
+            try:
+                futuro = loop.run_in_executor(self._executor, self._ejecutar, funcion)
+                resultado = await asyncio.wait_for(futuro, timeout or self.timeout)
+            except Exception:
+                DB_CONSULTAS.inc(resultado="error")
+                raise
+        DB_CONSULTAS.inc(resultado="ok")
+        return resultado
+
+    async def ejecutar(self, sql, params=()):
+        """Ejecuta una sentencia y devuelve el número de filas afectadas."""
+        def funcion(cursor):
+            cursor.execute(sql, params)
+            return cursor.rowcount
+        return await self.transaccion(funcion)
+
+    async def ejecutar_varios(self, sql, filas):
+        """Ejecuta la misma sentencia para cada fila en una sola transacción."""
+        def funcion(cursor):
+            cursor.executemany(sql, filas)
+            return cursor.rowcount
+        return await self.transaccion(funcion)
+
+    async def uno(self, sql, params=()):
+        """Devuelve la primera fila de una consulta, o None."""
+        def funcion(cursor):
+            cursor.execute(sql, params)
+            fila = cursor.fetchone()
+            cursor.fetchall()  # Descarta el resto para liberar la conexión
+            return fila
+        return await self.transaccion(funcion)
+
+    async def todos(self, sql, params=()):
+        """Devuelve todas las filas de una consulta."""
+        def funcion(cursor):
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+        return await self.transaccion(funcion)
+
+    async def comprobar(self, timeout=2):
+        """Indica si MySQL responde a una consulta trivial en menos de timeout segundos."""
+        def funcion(cursor):
+            cursor.execute("SELECT 1")
+            return cursor.fetchall()
+        try:
+            await self.transaccion(funcion, timeout=timeout)
+            return True
+        except Exception as e:
+            print("Error al comprobar la base de datos:", e)
+            return False
+
+    def cerrar(self):
+        self._executor.shutdown(wait=True)
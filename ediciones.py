@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import time
+
+from metricas import Contador, DISCORD_EDICION_SEGUNDOS, Histograma, Medidor
+
+# Programador de ediciones de mensajes.
+# Cada mensaje de partida tiene como mucho una edición en vuelo; los cambios
+# que llegan mientras tanto se fusionan (el último embed/vista gana) y se
+# envían juntos en la siguiente edición. El número de ediciones simultáneas
+# está acotado, y cuando se alcanza el límite se informa de la saturación en
+# lugar de acumular ediciones sin control.
+#
+# discord.py espera y reintenta por su cuenta las respuestas 429, así que la
+# presión de los límites de Discord se mide por tres vías: el tiempo que cada
+# edición espera turno aquí, su duración dentro de discord.py (que incluye
+# esas esperas) y los 429 que discord.py registra antes de reintentar.
+
+EDICIONES_FUSIONADAS = Contador(
+    "lavieja_ediciones_fusionadas_total", "Cambios fusionados con una edición pendiente."
+)
+LIMITES_DISCORD = Contador(
+    "lavieja_discord_rate_limit_total", "Respuestas 429 de Discord.", ("alcance",)
+)
+LIMITES_DISCORD_SEGUNDOS = Contador(
+    "lavieja_discord_rate_limit_segundos_total", "Segundos de espera impuestos por respuestas 429.", ("alcance",)
+)
+EDICIONES_ESPERA_SEGUNDOS = Histograma(
+    "lavieja_ediciones_espera_segundos", "Tiempo que una edición espera un hueco para enviarse."
+)
+EDICIONES_EN_VUELO = Medidor(
+    "lavieja_ediciones_en_vuelo", "Mensajes con una edición en curso o en espera."
+)
+
+
+class _ContadorLimites(logging.Handler):
+    """Cuenta los 429 que discord.py anota en su log antes de esperar y reintentar."""
+
+    def emit(self, record):
+        mensaje = record.msg if isinstance(record.msg, str) else ""
+        if mensaje.startswith("We are being rate limited"):
+            # Si la espera es demasiado larga, discord.py lanza el error sin esperar
+            alcance, espera = "ruta", record.args[-1] if "Retrying in" in mensaje else 0
+        elif mensaje.startswith("Global rate limit has been hit"):
+            alcance, espera = "global", record.args[0]
+        else:
+            return
+        LIMITES_DISCORD.inc(alcance=alcance)
+        LIMITES_DISCORD_SEGUNDOS.inc(espera, alcance=alcance)
+
+
+logging.getLogger("discord.http").addHandler(_ContadorLimites())
+
+
+class ProgramadorEdiciones:
+    def __init__(self, max_en_vuelo=25):
+        self.max_en_vuelo = max_en_vuelo  # Ediciones simultáneas hacia Discord
+        self._semaforo = None
+        self._pendientes = {}  # message_id -> (editor, cambios)
+        self._en_vuelo = {}  # message_id -> tarea que vacía los pendientes
+        EDICIONES_EN_VUELO.funcion = lambda: len(self._en_vuelo)
+
+    def saturado(self):
+        """Indica si hay más mensajes esperando edición que ediciones permitidas."""
+        return len(self._en_vuelo) >= self.max_en_vuelo
+
+    async def editar(self, message_id, editor, **cambios):
+        """Programa una edición y espera a que el estado quede enviado."""
+        if self._semaforo is None:
+            self._semaforo = asyncio.Semaphore(self.max_en_vuelo)
+        anterior = self._pendientes.get(message_id)
+        if anterior is not None:
+            EDICIONES_FUSIONADAS.inc()
+            cambios = {**anterior[1], **cambios}
+        self._pendientes[message_id] = (editor, cambios)
+        tarea = self._en_vuelo.get(message_id)
+        if tarea is None:
+            tarea = self._en_vuelo[message_id] = asyncio.ensure_future(self._vaciar(message_id))
+        await asyncio.shield(tarea)
+
+    async def _vaciar(self, message_id):
+        try:
+            while message_id in self._pendientes:
+                editor, cambios = self._pendientes.pop(message_id)
+                inicio = time.perf_counter()
+                async with self._semaforo:
+                    EDICIONES_ESPERA_SEGUNDOS.observar(time.perf_counter() - inicio)
+                    with DISCORD_EDICION_SEGUNDOS.tiempo(tipo=getattr(editor, "__name__", "edit")):
+                        await editor(**cambios)
+        except Exception:
+            self._pendientes.pop(message_id, None)
+            raise
+        finally:
+            del self._en_vuelo[message_id]
+
+    def descartar(self, message_id):
+        """Olvida los cambios pendientes de un mensaje que ya no se va a editar."""
+        self._pendientes.pop(message_id, None)
@@ -0,0 +1,72 @@
+import asyncio
+
+# Escritura diferida (write-behind) por lotes.
+# Base común de los registros que acumulan cambios en memoria y los escriben
+# en MySQL en lotes: una tarea los vacía cada `intervalo` segundos, o antes si
+# se acumulan `lote` cambios, y al cerrar se hace una última escritura. Las
+# subclases guardan sus cambios pendientes y definen _vaciar, que los escribe
+# y los reencola si la escritura falla.
+
+
+class EscrituraDiferida:
+    descripcion = "cambios"  # Qué se escribe, para los mensajes de error
+
+    def __init__(self, db, intervalo, lote):
+        self.db = db  # BaseDeDatos asíncrona
+        self.intervalo = intervalo  # Segundos máximos entre escrituras
+        self.lote = lote  # Cambios pendientes que fuerzan una escritura inmediata
+        self._evento = None
+        self._tarea = None
+        self._lock = None
+
+    def _avisar(self, pendientes):
+        # Adelanta la escritura si ya hay un lote completo
+        if self._evento is not None and pendientes >= self.lote:
+            self._evento.set()
+
+    def _obtener_lock(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def iniciar(self):
+        """Arranca la tarea que vacía los cambios pendientes periódicamente."""
+        if self._tarea is not None:
+            return
+        self._evento = asyncio.Event()
+        self._tarea = asyncio.create_task(self._bucle())
+
+    async def _bucle(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._evento.wait(), timeout=self.intervalo)
+            except asyncio.TimeoutError:
+                pass
+            self._evento.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error al guardar {self.descripcion}:", e)
+            await self._tras_flush()
+
+    async def _tras_flush(self):
+        """Trabajo periódico de la subclase después de cada escritura."""
+
+    async def flush(self):
+        """Escribe en un solo lote todos los cambios pendientes."""
+        async with self._obtener_lock():
+            await self._vaciar()
+
+    async def _vaciar(self):
+        raise NotImplementedError
+
+    async def cerrar(self):
+        """Detiene la tarea periódica y hace una última escritura."""
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+        await self.flush()
@@ -0,0 +1,427 @@
+import asyncio
+import time
+
+from ranking import IndiceRanking
+from shards import Particion
+
+# Caché de estadísticas en memoria con escritura diferida.
+# Es la fuente de verdad del proceso: las victorias, derrotas y empates se
+# aplican al instante en memoria y se acumulan como incrementos pendientes que
+# se escriben en la tabla stats por lotes. Cada servidor mantiene además un
+# índice de posiciones ordenado por (victorias desc, derrotas asc), que se
+# actualiza en O(log n) y responde al top K, a páginas y a la posición de un
+# usuario sin consultar MySQL.
+#
+# Con varias instancias, cada escritura incrementa la versión del servidor en
+# la tabla stats_versiones; las demás instancias la consultan periódicamente y
+# recargan los servidores cuya versión ha cambiado. Con varios procesos
+# repartidos por shards, cada uno carga y comprueba solo sus servidores.
+#
+# Para las tablas de la última semana o el último mes, los resultados se
+# acumulan también por día (UTC) en stats_periodos. Cada periodo de un
+# servidor tiene una ventana con sus totales y su propio índice de
+# posiciones: al cambiar de día solo se descuentan los días que salen de la
+# ventana, y los días más antiguos que el periodo más largo se borran.
+
+UPSERT_STATS = """
+INSERT INTO stats (guild_id, user_id, wins, losses, draws)
+VALUES (%s, %s, %s, %s, %s)
+ON DUPLICATE KEY UPDATE
+    wins = wins + VALUES(wins),
+    losses = losses + VALUES(losses),
+    draws = draws + VALUES(draws)
+"""
+
+UPSERT_STATS_DIAS = """
+INSERT INTO stats_periodos (guild_id, dia, user_id, wins, losses, draws)
+VALUES (%s, %s, %s, %s, %s, %s)
+ON DUPLICATE KEY UPDATE
+    wins = wins + VALUES(wins),
+    losses = losses + VALUES(losses),
+    draws = draws + VALUES(draws)
+"""
+
+INCREMENTAR_VERSION = """
+INSERT INTO stats_versiones (guild_id, version) VALUES (%s, 1)
+ON DUPLICATE KEY UPDATE version = version + 1
+"""
+
+
+# Días que abarca la tabla de posiciones de cada periodo
+PERIODOS = {"semana": 7, "mes": 30}
+DIAS_GUARDADOS = max(PERIODOS.values())
+
+
+def dia_actual():
+    """Número de día UTC desde 1970, la unidad de los periodos."""
+    return int(time.time() // 86400)
+
+
+def _clave_ranking(user, valores):
+    return (-valores[0], valores[1], user)
+
+
+def _sumar_valores(valores, wins, losses, draws):
+    valores[0] += wins
+    valores[1] += losses
+    valores[2] += draws
+
+
+def _paginar(ranking, inicio, n):
+    # Los empates en victorias y derrotas comparten la posición del primero del grupo
+    resultado = []
+    anterior = None
+    posicion = None
+    for desplazamiento, (wins, losses, user) in enumerate(ranking.pagina(inicio, n)):
+        if (wins, losses) != anterior:
+            if desplazamiento == 0:
+                posicion = ranking.posicion((wins, losses)) + 1
+            else:
+                posicion = inicio + desplazamiento + 1
+            anterior = (wins, losses)
+        resultado.append((posicion, user, -wins, losses))
+    return resultado
+
+
+class VentanaRanking:
+    """Totales y posiciones de un servidor en sus últimos días."""
+
+    def __init__(self, dias, excluidos, hoy, por_dia):
+        self.dias = dias
+        self.excluidos = excluidos
+        self.desde = hoy - dias + 1  # Primer día dentro de la ventana
+        self.usuarios = {}  # user_id -> [wins, losses, draws] dentro de la ventana
+        self.ranking = IndiceRanking()
+        for dia, usuarios in por_dia.items():
+            if dia >= self.desde:
+                for user, valores in usuarios.items():
+                    self.sumar(user, *valores)
+
+    def sumar(self, user, wins=0, losses=0, draws=0):
+        clasificado = user not in self.excluidos
+        valores = self.usuarios.get(user)
+        if valores is None:
+            valores = self.usuarios[user] = [0, 0, 0]
+        elif clasificado:
+            self.ranking.eliminar(_clave_ranking(user, valores))
+        _sumar_valores(valores, wins, losses, draws)
+        if not any(valores):
+            del self.usuarios[user]  # Sin partidas en la ventana: fuera de la tabla
+        elif clasificado:
+            self.ranking.insertar(_clave_ranking(user, valores))
+
+    def avanzar(self, hoy, por_dia):
+        """Descuenta los días que han salido de la ventana."""
+        desde = hoy - self.dias + 1
+        if desde <= self.desde:
+            return
+        for dia in sorted(d for d in por_dia if self.desde <= d < desde):
+            for user, (wins, losses, draws) in por_dia[dia].items():
+                self.sumar(user, -wins, -losses, -draws)
+        self.desde = desde
+
+
+class CacheEstadisticas:
+    def __init__(self, db, intervalo=5.0, lote=100, intervalo_versiones=30.0, excluidos=(), particion=None):
+        self.db = db
+        self.particion = particion or Particion()  # Servidores que gestiona este proceso
+        self.excluidos = set(excluidos)  # IDs de usuarios que no aparecen en la tabla de posiciones
+        self.intervalo = intervalo  # Segundos máximos entre escrituras
+        self.lote = lote  # Usuarios pendientes que fuerzan una escritura inmediata
+        self.intervalo_versiones = intervalo_versiones  # Segundos entre comprobaciones de versión
+        self._usuarios = {}  # guild_id -> {user_id: [wins, losses, draws]}
+        self._ranking = {}  # guild_id -> IndiceRanking de (-wins, losses, user_id)
+        self._pendientes = {}  # (guild_id, user_id) -> [wins, losses, draws] sin escribir
+        self._dias = {}  # guild_id -> {día: {user_id: [wins, losses, draws]}}
+        self._ventanas = {}  # (guild_id, periodo) -> VentanaRanking
+        self._pendientes_dias = {}  # (guild_id, día, user_id) -> [wins, losses, draws] sin escribir
+        self._compactado = None  # Último día en que se borraron los días caducados
+        self._versiones = {}  # guild_id -> última versión conocida
+        self._lock = None
+        self._evento = None
+        self._tareas = []
+
+    # Lectura
+
+    def obtener(self, guild_id, user):
+        """Devuelve (wins, losses, draws) de un usuario."""
+        valores = self._usuarios.get(guild_id, {}).get(user)
+        return tuple(valores) if valores else (0, 0, 0)
+
+    def _tabla(self, guild_id, periodo):
+        # (usuarios, ranking) del histórico o de la ventana de un periodo
+        if periodo is None:
+            return self._usuarios.get(guild_id, {}), self._ranking.get(guild_id)
+        ventana = self._ventana(guild_id, periodo, dia_actual())
+        return ventana.usuarios, ventana.ranking
+
+    def pagina(self, guild_id, inicio, n, periodo=None):
+        """Posición, usuario, victorias y derrotas desde la posición inicio (base 0).
+
+        Devuelve una lista de (posicion, user_id, wins, losses). Los empates en
+        victorias y derrotas comparten la posición del primero del grupo. Con
+        periodo ("semana" o "mes") solo cuentan los resultados de ese periodo.
+        """
+        _, ranking = self._tabla(guild_id, periodo)
+        if ranking is None:
+            return []
+        return _paginar(ranking, inicio, n)
+
+    def posicion(self, guild_id, user, periodo=None):
+        """Devuelve (posición, total) de un usuario, o None si no está clasificado."""
+        usuarios, ranking = self._tabla(guild_id, periodo)
+        valores = usuarios.get(user)
+        if ranking is None or valores is None or user in self.excluidos:
+            return None
+        return ranking.posicion((-valores[0], valores[1])) + 1, len(ranking)
+
+    def total(self, guild_id, periodo=None):
+        """Número de usuarios en la tabla de posiciones de un servidor."""
+        _, ranking = self._tabla(guild_id, periodo)
+        return len(ranking) if ranking is not None else 0
+
+    # Periodos
+
+    def _avanzar(self, guild_id, hoy):
+        # Las ventanas descuentan los días que salen antes de que se borren
+        por_dia = self._dias.get(guild_id, {})
+        for periodo in PERIODOS:
+            ventana = self._ventanas.get((guild_id, periodo))
+            if ventana is not None:
+                ventana.avanzar(hoy, por_dia)
+        limite = hoy - DIAS_GUARDADOS + 1
+        for dia in [d for d in por_dia if d < limite]:
+            del por_dia[dia]
+
+    def _ventana(self, guild_id, periodo, hoy):
+        self._avanzar(guild_id, hoy)
+        ventana = self._ventanas.get((guild_id, periodo))
+        if ventana is None:
+            # Se construye con la primera consulta y desde entonces se actualiza
+            ventana = self._ventanas[(guild_id, periodo)] = VentanaRanking(
+                PERIODOS[periodo], self.excluidos, hoy, self._dias.get(guild_id, {})
+            )
+        return ventana
+
+    # Escritura
+
+    def sumar(self, guild_id, user, wins=0, losses=0, draws=0):
+        """Aplica un resultado en memoria y lo deja pendiente de escritura."""
+        usuarios = self._usuarios.setdefault(guild_id, {})
+        ranking = self._ranking.get(guild_id)
+        if ranking is None:
+            ranking = self._ranking[guild_id] = IndiceRanking()
+        clasificado = user not in self.excluidos
+        valores = usuarios.get(user)
+        if valores is None:
+            valores = usuarios[user] = [0, 0, 0]
+        elif clasificado:
+            ranking.eliminar(_clave_ranking(user, valores))
+        _sumar_valores(valores, wins, losses, draws)
+        if clasificado:
+            ranking.insertar(_clave_ranking(user, valores))
+
+        hoy = dia_actual()
+        self._avanzar(guild_id, hoy)
+        del_dia = self._dias.setdefault(guild_id, {}).setdefault(hoy, {})
+        _sumar_valores(del_dia.setdefault(user, [0, 0, 0]), wins, losses, draws)
+        for periodo in PERIODOS:
+            ventana = self._ventanas.get((guild_id, periodo))
+            if ventana is not None:
+                ventana.sumar(user, wins, losses, draws)
+
+        _sumar_valores(self._pendientes.setdefault((guild_id, user), [0, 0, 0]), wins, losses, draws)
+        _sumar_valores(self._pendientes_dias.setdefault((guild_id, hoy, user), [0, 0, 0]), wins, losses, draws)
+        if self._evento is not None and len(self._pendientes) >= self.lote:
+            self._evento.set()
+
+    def _reemplazar_guild(self, guild_id, filas, filas_dias=()):
+        # filas: [(user_id, wins, losses, draws)] y filas_dias:
+        # [(día, user_id, wins, losses, draws)] leídas de MySQL
+        usuarios = {user: [wins, losses, draws] for user, wins, losses, draws in filas}
+        por_dia = {}
+        for dia, user, wins, losses, draws in filas_dias:
+            por_dia.setdefault(dia, {})[user] = [wins, losses, draws]
+        # Los incrementos aún no escritos se vuelven a aplicar sobre lo leído
+        for (g, user), pendiente in self._pendientes.items():
+            if g == guild_id:
+                _sumar_valores(usuarios.setdefault(user, [0, 0, 0]), *pendiente)
+        for (g, dia, user), pendiente in self._pendientes_dias.items():
+            if g == guild_id:
+                _sumar_valores(por_dia.setdefault(dia, {}).setdefault(user, [0, 0, 0]), *pendiente)
+        self._usuarios[guild_id] = usuarios
+        self._ranking[guild_id] = IndiceRanking(
+            _clave_ranking(u, v) for u, v in usuarios.items() if u not in self.excluidos
+        )
+        self._dias[guild_id] = por_dia
+        # Las ventanas se reconstruyen con la próxima consulta
+        for periodo in PERIODOS:
+            self._ventanas.pop((guild_id, periodo), None)
+
+    def invalidar(self, guild_id):
+        """Olvida la versión conocida de un servidor para recargarlo en la próxima comprobación."""
+        self._versiones.pop(guild_id, None)
+
+    # Sincronización con MySQL
+
+    def _obtener_lock(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def cargar(self, guild_ids=None):
+        """Carga desde MySQL todos los servidores, o solo los indicados."""
+        desde = dia_actual() - DIAS_GUARDADOS + 1
+        async with self._obtener_lock():
+            if guild_ids is None:
+                clausula, params = self.particion.sql()
+                filas = await self.db.todos(
+                    f"SELECT guild_id, user_id, wins, losses, draws FROM stats WHERE {clausula}", params
+                )
+                filas_dias = await self.db.todos(
+                    "SELECT guild_id, dia, user_id, wins, losses, draws FROM stats_periodos "
+                    f"WHERE {clausula} AND dia >= %s", (*params, desde)
+                )
+                versiones = await self.db.todos(
+                    f"SELECT guild_id, version FROM stats_versiones WHERE {clausula}", params
+                )
+                guild_ids = {fila[0] for fila in filas} | set(self._usuarios)
+            else:
+                guild_ids = set(guild_ids)
+                if not guild_ids:
+                    return
+                marcadores = ", ".join(["%s"] * len(guild_ids))
+                filas = await self.db.todos(
+                    f"SELECT guild_id, user_id, wins, losses, draws FROM stats WHERE guild_id IN ({marcadores})",
+                    tuple(guild_ids)
+                )
+                filas_dias = await self.db.todos(
+                    "SELECT guild_id, dia, user_id, wins, losses, draws FROM stats_periodos "
+                    f"WHERE guild_id IN ({marcadores}) AND dia >= %s", (*guild_ids, desde)
+                )
+                versiones = await self.db.todos(
+                    f"SELECT guild_id, version FROM stats_versiones WHERE guild_id IN ({marcadores})",
+                    tuple(guild_ids)
+                )
+            por_guild = {guild_id: [] for guild_id in guild_ids}
+            dias_por_guild = {}
+            for guild_id, user, wins, losses, draws in filas:
+                por_guild.setdefault(guild_id, []).append((user, wins, losses, draws))
+            for guild_id, dia, user, wins, losses, draws in filas_dias:
+                dias_por_guild.setdefault(guild_id, []).append((dia, user, wins, losses, draws))
+            for guild_id, filas_guild in por_guild.items():
+                self._reemplazar_guild(guild_id, filas_guild, dias_por_guild.get(guild_id, ()))
+            for guild_id, version in versiones:
+                self._versiones[guild_id] = version
+
+    async def flush(self):
+        """Escribe en un solo lote los incrementos pendientes."""
+        async with self._obtener_lock():
+            if not self._pendientes:
+                return
+            pendientes, self._pendientes = self._pendientes, {}
+            pendientes_dias, self._pendientes_dias = self._pendientes_dias, {}
+            filas = [
+                (guild_id, user, wins, losses, draws)
+                for (guild_id, user), (wins, losses, draws) in pendientes.items()
+            ]
+            filas_dias = [
+                (guild_id, dia, user, wins, losses, draws)
+                for (guild_id, dia, user), (wins, losses, draws) in pendientes_dias.items()
+            ]
+            guild_ids = sorted({guild_id for guild_id, _ in pendientes})
+
+            def escribir(cursor):
+                cursor.executemany(UPSERT_STATS, filas)
+                if filas_dias:
+                    cursor.executemany(UPSERT_STATS_DIAS, filas_dias)
+                cursor.executemany(INCREMENTAR_VERSION, [(g,) for g in guild_ids])
+                marcadores = ", ".join(["%s"] * len(guild_ids))
+                cursor.execute(
+                    f"SELECT guild_id, version FROM stats_versiones WHERE guild_id IN ({marcadores})",
+                    guild_ids
+                )
+                return cursor.fetchall()
+
+            try:
+                versiones = await self.db.transaccion(escribir)
+            except Exception:
+                # Devolver los incrementos a la cola para el siguiente intento
+                for clave, valores in pendientes.items():
+                    _sumar_valores(self._pendientes.setdefault(clave, [0, 0, 0]), *valores)
+                for clave, valores in pendientes_dias.items():
+                    _sumar_valores(self._pendientes_dias.setdefault(clave, [0, 0, 0]), *valores)
+                raise
+            for guild_id, version in versiones:
+                # Si otra instancia escribió desde la última versión conocida,
+                # se invalida para recargar el servidor
+                if self._versiones.get(guild_id, 0) + 1 == version:
+                    self._versiones[guild_id] = version
+                else:
+                    self.invalidar(guild_id)
+
+    async def comprobar_versiones(self):
+        """Recarga los servidores modificados por otras instancias."""
+        clausula, params = self.particion.sql()
+        versiones = await self.db.todos(
+            f"SELECT guild_id, version FROM stats_versiones WHERE {clausula}", params
+        )
+        cambiados = [g for g, v in versiones if self._versiones.get(g) != v]
+        await self.cargar(cambiados)
+
+    async def compactar(self):
+        """Borra de MySQL los días más antiguos que el periodo más largo."""
+        hoy = dia_actual()
+        clausula, params = self.particion.sql()
+        await self.db.ejecutar(
+            f"DELETE FROM stats_periodos WHERE {clausula} AND dia < %s",
+            (*params, hoy - DIAS_GUARDADOS + 1)
+        )
+        self._compactado = hoy
+
+    async def iniciar(self):
+        """Arranca las tareas periódicas de escritura y de comprobación de versiones."""
+        if self._tareas:
+            return
+        self._evento = asyncio.Event()
+        self._tareas = [
+            asyncio.create_task(self._bucle_flush()),
+            asyncio.create_task(self._bucle_versiones()),
+        ]
+
+    async def _bucle_flush(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._evento.wait(), timeout=self.intervalo)
+            except asyncio.TimeoutError:
+                pass
+            self._evento.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print("Error al guardar estadísticas:", e)
+
+    async def _bucle_versiones(self):
+        while True:
+            await asyncio.sleep(self.intervalo_versiones)
+            try:
+                await self.comprobar_versiones()
+            except Exception as e:
+                print("Error al comprobar versiones de estadísticas:", e)
+            if self._compactado != dia_actual():
+                try:
+                    await self.compactar()
+                except Exception as e:
+                    print("Error al compactar estadísticas por día:", e)
+
+    async def cerrar(self):
+        """Detiene las tareas periódicas y hace una última escritura."""
+        for tarea in self._tareas:
+            tarea.cancel()
+        for tarea in self._tareas:
+            try:
+                await tarea
+            except asyncio.CancelledError:
+                pass
+        self._tareas = []
+        await self.flush()
@@ -0,0 +1,203 @@
+import argparse
+import asyncio
+import os
+import struct
+import time
+from collections import Counter
+
+from escritura import EscrituraDiferida
+from metricas import cronometrado
+from motor import VICTORIA, TicTacToeGame, rival
+from tablero import variante_de_tamano
+
+# Registro de jugadas (event sourcing) en la tabla movimientos.
+# Cada jugada es una fila pequeña y de solo inserción: partida, servidor,
+# número de jugada, casilla, ficha, tamaño del tablero y momento en ms. Las
+# filas se acumulan en memoria y se escriben por lotes. A partir de ellas se
+# puede reconstruir cualquier partida, y se pueden exportar a un archivo
+# binario de registros fijos para analizarlas sin tocar las tablas en vivo:
+#
+#   python historial.py exportar movimientos.bin
+#   python historial.py aperturas movimientos.bin
+
+INSERT_MOVIMIENTO = """
+INSERT INTO movimientos (partida, guild_id, numero, casilla, ficha, tamano, momento)
+VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+
+# Archivo de exportación: cabecera y registros de 28 bytes en little-endian
+# (partida, guild_id, momento, numero, casilla, tamano, ficha)
+CABECERA = struct.Struct("<4sHI")
+MAGIA = b"LVMV"
+VERSION = 1
+REGISTRO = struct.Struct("<qqqBBBc")
+
+
+def movimiento(message_id, game, casilla, ficha):
+    """Fila de la tabla movimientos para una jugada recién aplicada a la partida."""
+    numero = (game.x | game.o).bit_count()
+    return (
+        message_id, game.guild_id, numero, casilla, ficha,
+        game.variante.n, int(time.time() * 1000)
+    )
+
+
+def reproducir(game, jugadas):
+    """Aplica a una partida las jugadas [(casilla, ficha)] en orden.
+
+    Es idempotente: una jugada que ya está en el tablero no lo cambia, así que
+    se puede reproducir el registro completo sobre cualquier instantánea
+    anterior de la partida.
+    """
+    ultima = None
+    for casilla, ficha in jugadas:
+        game.marcar(casilla, ficha)
+        ultima = ficha
+    if ultima is not None:
+        game.jugador_actual = rival(ultima)
+    return game
+
+
+class HistorialMovimientos(EscrituraDiferida):
+    descripcion = "movimientos"
+
+    def __init__(self, db, intervalo=2.0, lote=200):
+        super().__init__(db, intervalo, lote)
+        self._pendientes = []
+
+    def registrar(self, message_id, game, casilla, ficha):
+        """Añade una jugada al registro."""
+        self._pendientes.append(movimiento(message_id, game, casilla, ficha))
+        self._avisar(len(self._pendientes))
+
+    async def jugadas(self, message_id):
+        """Jugadas [(casilla, ficha)] de una partida, escritas o pendientes, en orden."""
+        filas = await self.db.todos(
+            "SELECT casilla, ficha FROM movimientos WHERE partida = %s ORDER BY numero",
+            (message_id,)
+        )
+        pendientes = [(fila[3], fila[4]) for fila in self._pendientes if fila[0] == message_id]
+        return list(filas) + pendientes
+
+    @cronometrado("flush_movimientos")
+    async def _vaciar(self):
+        if not self._pendientes:
+            return
+        filas, self._pendientes = self._pendientes, []
+        try:
+            await self.db.ejecutar_varios(INSERT_MOVIMIENTO, filas)
+        except Exception:
+            # Conservar el orden: las jugadas fallidas van delante de las nuevas
+            self._pendientes[:0] = filas
+            raise
+
+
+# Exportación y análisis sin conexión
+
+
+async def exportar(db, ruta, bloque=10000):
+    """Vuelca la tabla movimientos a un archivo binario; devuelve el número de jugadas."""
+    total = 0
+    ultimo_id = 0
+    with open(ruta, "wb") as f:
+        f.write(CABECERA.pack(MAGIA, VERSION, 0))
+        while True:
+            filas = await db.todos(
+                "SELECT id, partida, guild_id, momento, numero, casilla, tamano, ficha "
+                "FROM movimientos WHERE id > %s ORDER BY id LIMIT %s",
+                (ultimo_id, bloque)
+            )
+            if not filas:
+                break
+            f.write(b"".join(
+                REGISTRO.pack(partida, guild_id, momento, numero, casilla, tamano, ficha.encode())
+                for _, partida, guild_id, momento, numero, casilla, tamano, ficha in filas
+            ))
+            total += len(filas)
+            ultimo_id = filas[-1][0]
+        # El número de registros se escribe al final, cuando ya se conoce
+        f.seek(0)
+        f.write(CABECERA.pack(MAGIA, VERSION, total))
+    return total
+
+
+def leer(ruta):
+    """Registros (partida, guild_id, momento, numero, casilla, tamano, ficha) de una exportación."""
+    with open(ruta, "rb") as f:
+        magia, version, _ = CABECERA.unpack(f.read(CABECERA.size))
+        if magia != MAGIA or version != VERSION:
+            raise ValueError(f"{ruta} no es una exportación de movimientos válida")
+        datos = f.read()
+    for partida, guild_id, momento, numero, casilla, tamano, ficha in REGISTRO.iter_unpack(datos):
+        yield partida, guild_id, momento, numero, casilla, tamano, ficha.decode()
+
+
+def partidas_exportadas(registros):
+    """Agrupa los registros por partida y reconstruye cada una."""
+    por_partida = {}
+    for partida, guild_id, _, numero, casilla, tamano, ficha in registros:
+        por_partida.setdefault(partida, (guild_id, tamano, []))[2].append((numero, casilla, ficha))
+    for partida, (guild_id, tamano, jugadas) in por_partida.items():
+        jugadas.sort()
+        game = TicTacToeGame(guild_id, variante=variante_de_tamano(tamano).nombre)
+        yield partida, reproducir(game, [(casilla, ficha) for _, casilla, ficha in jugadas]), jugadas
+
+
+def aperturas(registros, profundidad=1):
+    """Frecuencia y resultados de las primeras jugadas por variante.
+
+    Devuelve {(variante, apertura): Counter(resultado)}, donde la apertura es
+    la tupla de las primeras casillas y el resultado la ficha ganadora,
+    "empate" o "en curso".
+    """
+    resultados = {}
+    for _, game, jugadas in partidas_exportadas(registros):
+        if len(jugadas) < profundidad:
+            continue
+        apertura = tuple(casilla for _, casilla, _ in jugadas[:profundidad])
+        resultado = game.resultado()
+        if resultado == VICTORIA:
+            resultado = rival(game.jugador_actual)  # Ganó quien hizo la última jugada
+        elif resultado is None:
+            resultado = "en curso"
+        clave = (game.variante.nombre, apertura)
+        resultados.setdefault(clave, Counter())[resultado] += 1
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Registro de jugadas de La Vieja.")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    exp = comandos.add_parser("exportar", help="Vuelca la tabla movimientos a un archivo binario.")
+    exp.add_argument("ruta")
+    ape = comandos.add_parser("aperturas", help="Estadísticas de aperturas de una exportación.")
+    ape.add_argument("ruta")
+    ape.add_argument("--profundidad", type=int, default=1, help="Jugadas que forman la apertura.")
+    args = parser.parse_args()
+
+    if args.comando == "exportar":
+        from db import BaseDeDatos
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        db = BaseDeDatos(
+            host=os.getenv("MYSQLHOST"),
+            user=os.getenv("MYSQLUSER"),
+            password=os.getenv("MYSQLPASSWORD"),
+            database=os.getenv("MYSQLDATABASE")
+        )
+        try:
+            total = asyncio.run(exportar(db, args.ruta))
+        finally:
+            db.cerrar()
+        print(f"{total} jugadas exportadas a {args.ruta}")
+    else:
+        resultados = aperturas(leer(args.ruta), args.profundidad)
+        for (variante, apertura), conteo in sorted(resultados.items(), key=lambda kv: -sum(kv[1].values())):
+            total = sum(conteo.values())
+            detalle = "  ".join(f"{k}: {v / total:.0%}" for k, v in sorted(conteo.items()))
+            print(f"{variante} {apertura}: {total} partidas  {detalle}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import argparse
+import json
+import os
+
+from simetria import SIMETRIAS
+from tablero import VARIANTES
+
+# Libro de aperturas del bot.
+# Para las primeras jugadas de cada variante guarda las mejores respuestas,
+# calculadas sin conexión con una búsqueda de profundidad fija mucho mayor que
+# la que cabe en el tiempo de una jugada. Las posiciones se indexan por su
+# forma canónica (ver simetria.py) y las jugadas están en el marco canónico,
+# así que cada entrada sirve para las 8 posiciones simétricas.
+#
+# El libro se guarda en libro.json y se regenera con:
+#
+#   python libro.py --plies 2
+
+RUTA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "libro.json")
+
+# Profundidad de la búsqueda con la que se genera cada variante
+PROFUNDIDAD = {"3x3": 9, "4x4": 6, "5x5": 4}
+
+
+def cargar(ruta=RUTA):
+    """{variante: {clave canónica: jugadas}} del archivo del libro."""
+    try:
+        with open(ruta) as f:
+            datos = json.load(f)
+    except FileNotFoundError:
+        print(f"No se encontró el libro de aperturas en {ruta}")
+        return {}
+    return {
+        nombre: {int(clave): tuple(jugadas) for clave, jugadas in variante["posiciones"].items()}
+        for nombre, variante in datos.items()
+    }
+
+
+LIBRO = cargar()
+# Fichas de la posición más avanzada del libro de cada variante
+FICHAS_MAXIMAS = {
+    nombre: max((clave.bit_count() for clave in posiciones), default=0)
+    for nombre, posiciones in LIBRO.items()
+}
+
+
+def consultar(nombre_variante, x, o):
+    """Jugadas del libro para la posición, en el marco del tablero, o None."""
+    if (x | o).bit_count() > FICHAS_MAXIMAS.get(nombre_variante, -1):
+        return None  # Fuera del libro, sin calcular la forma canónica
+    simetrias = SIMETRIAS[nombre_variante]
+    cx, co, t = simetrias.canonica(x, o)
+    jugadas = LIBRO.get(nombre_variante, {}).get(cx << simetrias.variante.total | co)
+    if jugadas is None:
+        return None
+    return [simetrias.deshacer(t, i) for i in jugadas]
+
+
+# Generación
+
+
+def _posiciones(variante, plies):
+    """Posiciones canónicas con hasta plies fichas, alcanzables y sin terminar."""
+    simetrias = SIMETRIAS[variante.nombre]
+    nivel = {(0, 0)}
+    posiciones = [(0, 0)]
+    for ply in range(plies):
+        siguiente = set()
+        for x, o in nivel:
+            for i in variante.libres(x, o):
+                nx, no = (x | variante.casillas[i], o) if ply % 2 == 0 else (x, o | variante.casillas[i])
+                if not variante.hay_linea(nx) and not variante.hay_linea(no):
+                    siguiente.add(simetrias.canonica(nx, no)[:2])
+        nivel = siguiente
+        posiciones.extend(sorted(nivel))
+    return posiciones
+
+
+def mejores_jugadas(motor, x, o, profundidad):
+    """Jugadas de mayor valor con ventana completa; desempata la cercanía al centro."""
+    from busqueda import GANA
+
+    variante = motor.variante
+    ficha = "X" if x.bit_count() == o.bit_count() else "O"
+    propio, rival = (x, o) if ficha == "X" else (o, x)
+    color = 0 if ficha == "X" else 1
+    hs = motor.hashes(x, o)
+    motor.tt.nueva_busqueda()
+    valores = {}
+    for i in variante.libres(x, o):
+        valores[i] = -motor._negamax(
+            rival, propio | variante.casillas[i],
+            tuple(map(int.__xor__, hs, motor.zobrist_simetrico[color][i])),
+            1 - color, profundidad - 1, -GANA - 1, GANA + 1, 1
+        )
+    mejor = max(valores.values())
+    medio = (variante.n - 1) / 2
+    distancia = {i: abs(i // variante.n - medio) + abs(i % variante.n - medio) for i in valores}
+    candidatas = [i for i, v in valores.items() if v == mejor]
+    cercania = min(distancia[i] for i in candidatas)
+    return sorted(i for i in candidatas if distancia[i] == cercania)
+
+
+def generar(plies=2, variantes=None):
+    """Calcula el libro de las posiciones con hasta plies fichas."""
+    from busqueda import Motor
+
+    datos = {}
+    for nombre in variantes or VARIANTES:
+        variante = VARIANTES[nombre]
+        # 3x3 se resuelve entero con solver.py: solo hace falta la apertura
+        posiciones = _posiciones(variante, 0 if nombre == "3x3" else plies)
+        motor = Motor(variante, bits_tt=20)
+        profundidad = PROFUNDIDAD[nombre]
+        datos[nombre] = {
+            "profundidad": profundidad,
+            "posiciones": {
+                str(x << variante.total | o): mejores_jugadas(
+                    motor, x, o, min(profundidad, len(variante.libres(x, o)))
+                )
+                for x, o in posiciones
+            },
+        }
+        print(f"{nombre}: {len(posiciones)} posiciones a profundidad {profundidad}")
+    return datos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera el libro de aperturas de La Vieja.")
+    parser.add_argument("--plies", type=int, default=2, help="Fichas en el tablero como máximo.")
+    parser.add_argument("--salida", default=RUTA, help="Archivo JSON del libro.")
+    args = parser.parse_args()
+    datos = generar(args.plies)
+    with open(args.salida, "w") as f:
+        json.dump(datos, f, sort_keys=True)
+        f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# Instrumentación ligera exportada en formato de texto de Prometheus.
+# Las métricas se actualizan desde el event loop y desde los hilos del pool de
+# MySQL, y el servidor HTTP las lee en el mismo event loop, así que cada una
+# tiene su propio lock para las escrituras desde otros hilos.
+
+BUCKETS_SEGUNDOS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_NODOS = (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+
+
+def _etiquetas(nombres, valores):
+    if not nombres:
+        return ""
+    pares = ",".join(f'{n}="{v}"' for n, v in zip(nombres, valores))
+    return "{" + pares + "}"
+
+
+class Metrica:
+    tipo = None
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+        REGISTRO.registrar(self)
+
+    def _clave(self, etiquetas):
+        return tuple(str(etiquetas.get(n, "")) for n in self.etiquetas)
+
+    def exportar(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        lineas.extend(self._muestras())
+        return "\n".join(lineas)
+
+
+class Contador(Metrica):
+    tipo = "counter"
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        super().__init__(nombre, ayuda, etiquetas)
+        self._valores = {}
+
+    def inc(self, valor=1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+
+    def _muestras(self):
+        with self._lock:
+            valores = list(self._valores.items())
+        return [f"{self.nombre}{_etiquetas(self.etiquetas, k)} {v}" for k, v in valores]
+
+
+class Medidor(Metrica):
+    """Valor instantáneo; opcionalmente calculado al exportar con una función."""
+    tipo = "gauge"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), funcion=None):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.funcion = funcion
+        self._valores = {}
+
+    def set(self, valor, **etiquetas):
+        with self._lock:
+            self._valores[self._clave(etiquetas)] = valor
+
+    def _muestras(self):
+        if self.funcion is not None:
+            # La función devuelve un valor, o {etiquetas: valor} si la métrica tiene etiquetas
+            try:
+                valor = self.funcion()
+            except Exception:
+                return []
+            if not isinstance(valor, dict):
+                return [f"{self.nombre} {valor}"]
+            return [
+                f"{self.nombre}{_etiquetas(self.etiquetas, k if isinstance(k, tuple) else (k,))} {v}"
+                for k, v in valor.items()
+            ]
+        with self._lock:
+            valores = list(self._valores.items())
+        return [f"{self.nombre}{_etiquetas(self.etiquetas, k)} {v}" for k, v in valores]
+
+
+class Histograma(Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_SEGUNDOS):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(buckets)
+        self._series = {}  # etiquetas -> [conteos por bucket, suma, total]
+
+    def observar(self, valor, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [[0] * len(self.buckets), 0.0, 0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[0][i] += 1
+                    break
+            serie[1] += valor
+            serie[2] += 1
+
+    @contextmanager
+    def tiempo(self, **etiquetas):
+        """Mide la duración del bloque en segundos."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **etiquetas)
+
+    def _muestras(self):
+        with self._lock:
+            series = [(k, list(s[0]), s[1], s[2]) for k, s in self._series.items()]
+        muestras = []
+        nombres = self.etiquetas + ("le",)
+        for clave, conteos, suma, total in series:
+            acumulado = 0
+            for limite, conteo in zip(self.buckets, conteos):
+                acumulado += conteo
+                muestras.append(f"{self.nombre}_bucket{_etiquetas(nombres, clave + (limite,))} {acumulado}")
+            muestras.append(f"{self.nombre}_bucket{_etiquetas(nombres, clave + ('+Inf',))} {total}")
+            muestras.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {suma}")
+            muestras.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {total}")
+        return muestras
+
+
+def cronometrado(handler):
+    """Decorador que mide la duración de una corrutina en HANDLER_SEGUNDOS."""
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        async def envoltura(*args, **kwargs):
+            with HANDLER_SEGUNDOS.tiempo(handler=handler):
+                return await funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+class Registro:
+    def __init__(self):
+        self._metricas = []
+
+    def registrar(self, metrica):
+        self._metricas.append(metrica)
+
+    def exportar(self):
+        """Todas las métricas en formato de texto de Prometheus."""
+        return "\n".join(m.exportar() for m in self._metricas) + "\n"
+
+
+REGISTRO = Registro()
+
+# Métricas del bot
+HANDLER_SEGUNDOS = Histograma(
+    "lavieja_handler_segundos", "Duración de los handlers de juego.", ("handler",)
+)
+NODOS_BUSQUEDA = Histograma(
+    "lavieja_nodos_busqueda", "Nodos explorados por jugada del bot.",
+    ("variante", "dificultad"), buckets=BUCKETS_NODOS
+)
+DB_CONSULTAS = Contador(
+    "lavieja_db_consultas_total", "Transacciones ejecutadas en MySQL.", ("resultado",)
+)
+DB_SEGUNDOS = Histograma(
+    "lavieja_db_segundos", "Duración de las transacciones en MySQL, incluida la espera en el pool."
+)
+DISCORD_EDICION_SEGUNDOS = Histograma(
+    "lavieja_discord_edicion_segundos", "Latencia de las ediciones de mensajes en Discord.", ("tipo",)
+)
+PARTIDAS_ACTIVAS = Medidor(
+    "lavieja_partidas_activas", "Partidas en memoria."
+)
+SHARD_LATENCIA = Medidor(
+    "lavieja_shard_latencia_segundos", "Latencia del heartbeat de cada shard de este proceso.", ("shard",)
+)
+SHARD_CONECTADO = Medidor(
+    "lavieja_shard_conectado", "1 si el shard está conectado al gateway.", ("shard",)
+)
+SHARD_PARTIDAS = Medidor(
+    "lavieja_shard_partidas_activas", "Partidas en memoria de cada shard.", ("shard",)
+)
+ARRANQUE_SEGUNDOS = Medidor(
+    "lavieja_arranque_segundos", "Duración de cada etapa del arranque, incluidos los reintentos.", ("etapa",)
+)
+RETRASO_LOOP = Medidor(
+    "lavieja_loop_retraso_segundos", "Retraso del event loop en la última medición."
+)
+CLICS_DESCARTADOS = Contador(
+    "lavieja_clics_descartados_total", "Clics ignorados por llegar mientras la partida procesaba otro.", ("motivo",)
+)
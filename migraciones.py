@@ -0,0 +1,212 @@
+import json
+
+from persistencia import id_de_mencion
+from tablero import variante_de_texto
+
+# Migraciones versionadas del esquema de MySQL.
+# La tabla schema_version guarda la última versión aplicada; al arrancar se
+# aplican en orden las migraciones posteriores. Un lock con nombre de MySQL
+# evita que varios procesos (shards) migren a la vez. Cada migración debe
+# poder repetirse si se interrumpe a medias.
+
+
+def _v1_esquema_inicial(cursor):
+    """Tablas tal como las creaba crear_tablas antes de las migraciones."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS partidas (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        guild_id BIGINT,
+        message_id BIGINT,
+        tablero VARCHAR(25),
+        jugador_actual CHAR(1),
+        modo_vs_bot BOOLEAN,
+        partida_activa BOOLEAN,
+        jugadores JSON,
+        dificultad VARCHAR(10)
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS stats (
+        guild_id BIGINT,
+        user VARCHAR(255),
+        wins INT DEFAULT 0,
+        losses INT DEFAULT 0,
+        draws INT DEFAULT 0,
+        PRIMARY KEY (guild_id, user)
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS stats_versiones (
+        guild_id BIGINT PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 0
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS movimientos (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        partida BIGINT NOT NULL,
+        guild_id BIGINT NOT NULL,
+        numero TINYINT UNSIGNED NOT NULL,
+        casilla TINYINT UNSIGNED NOT NULL,
+        ficha CHAR(1) NOT NULL,
+        tamano TINYINT UNSIGNED NOT NULL,
+        momento BIGINT NOT NULL,
+        INDEX (partida)
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS bot_meta (
+        clave VARCHAR(64) PRIMARY KEY,
+        valor TEXT
+    )
+    """)
+    # Tableros de hasta 5x5 para las variantes grandes
+    cursor.execute("ALTER TABLE partidas MODIFY tablero VARCHAR(25)")
+
+
+def _v2_ids_numericos(cursor):
+    """IDs de usuario BIGINT, tablero en bitboards e índices por servidor."""
+    cursor.execute("SHOW COLUMNS FROM stats LIKE 'user_id'")
+    if cursor.fetchall():
+        return  # Ya migrado: solo faltaba registrar la versión
+
+    # stats: una fila por (servidor, usuario) aunque hubiera menciones <@id> y
+    # <@!id> del mismo usuario; el índice de ranking cubre la tabla de posiciones
+    cursor.execute("DROP TABLE IF EXISTS stats_nueva")
+    cursor.execute("""
+    CREATE TABLE stats_nueva (
+        guild_id BIGINT NOT NULL,
+        user_id BIGINT UNSIGNED NOT NULL,
+        wins INT NOT NULL DEFAULT 0,
+        losses INT NOT NULL DEFAULT 0,
+        draws INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (guild_id, user_id),
+        INDEX ranking (guild_id, wins DESC, losses ASC, user_id)
+    )
+    """)
+    cursor.execute("""
+    INSERT INTO stats_nueva (guild_id, user_id, wins, losses, draws)
+    SELECT guild_id, CAST(REPLACE(REPLACE(REPLACE(user, '<@!', ''), '<@', ''), '>', '') AS UNSIGNED),
+           SUM(wins), SUM(losses), SUM(draws)
+    FROM stats
+    WHERE user REGEXP '^<@!?[0-9]+>$'
+    GROUP BY 1, 2
+    """)
+
+    # partidas: message_id como clave, jugadores como IDs y tablero como dos
+    # bitboards más el tamaño
+    cursor.execute("DROP TABLE IF EXISTS partidas_nueva")
+    cursor.execute("""
+    CREATE TABLE partidas_nueva (
+        message_id BIGINT NOT NULL PRIMARY KEY,
+        guild_id BIGINT NOT NULL,
+        x INT UNSIGNED NOT NULL DEFAULT 0,
+        o INT UNSIGNED NOT NULL DEFAULT 0,
+        tamano TINYINT UNSIGNED NOT NULL,
+        jugador_actual CHAR(1) NOT NULL,
+        modo_vs_bot BOOLEAN NOT NULL,
+        partida_activa BOOLEAN NOT NULL,
+        jugador_x BIGINT UNSIGNED NOT NULL,
+        jugador_o BIGINT UNSIGNED NOT NULL,
+        dificultad VARCHAR(10),
+        INDEX (guild_id, message_id)
+    )
+    """)
+    cursor.execute(
+        "SELECT guild_id, message_id, tablero, jugador_actual, modo_vs_bot, partida_activa, "
+        "jugadores, dificultad FROM partidas ORDER BY id"
+    )
+    filas = {}
+    for guild_id, message_id, tablero, jugador_actual, modo_vs_bot, partida_activa, jugadores, dificultad in cursor.fetchall():
+        try:
+            variante = variante_de_texto(tablero)
+            x, o = variante.desde_texto(tablero)
+            jugadores = json.loads(jugadores)
+            filas[message_id] = (
+                message_id, guild_id, x, o, variante.n, jugador_actual, modo_vs_bot, partida_activa,
+                id_de_mencion(jugadores["X"]), id_de_mencion(jugadores["O"]), dificultad
+            )
+        except Exception as e:
+            print(f"Partida {message_id} descartada en la migración:", e)
+    if filas:
+        cursor.executemany(
+            "INSERT INTO partidas_nueva VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+            list(filas.values())
+        )
+
+    cursor.execute("DROP TABLE IF EXISTS stats_antigua, partidas_antigua")
+    cursor.execute(
+        "RENAME TABLE stats TO stats_antigua, stats_nueva TO stats, "
+        "partidas TO partidas_antigua, partidas_nueva TO partidas"
+    )
+    cursor.execute("DROP TABLE stats_antigua, partidas_antigua")
+
+
+def _v3_stats_por_dia(cursor):
+    """Resultados por servidor, día y usuario para las tablas por periodo."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS stats_periodos (
+        guild_id BIGINT NOT NULL,
+        dia INT NOT NULL,
+        user_id BIGINT UNSIGNED NOT NULL,
+        wins INT NOT NULL DEFAULT 0,
+        losses INT NOT NULL DEFAULT 0,
+        draws INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (guild_id, dia, user_id),
+        INDEX (dia)
+    )
+    """)
+
+
+def _v4_partidas_actualizada(cursor):
+    """Instante de la última escritura de cada partida, para borrar las abandonadas."""
+    cursor.execute("SHOW COLUMNS FROM partidas LIKE 'actualizada'")
+    if cursor.fetchall():
+        return
+    cursor.execute(
+        "ALTER TABLE partidas ADD COLUMN actualizada BIGINT NOT NULL DEFAULT 0, ADD INDEX (actualizada)"
+    )
+    # Las partidas ya guardadas cuentan desde ahora, no como caducadas
+    cursor.execute("UPDATE partidas SET actualizada = UNIX_TIMESTAMP()")
+
+
+MIGRACIONES = [
+    (1, _v1_esquema_inicial),
+    (2, _v2_ids_numericos),
+    (3, _v3_stats_por_dia),
+    (4, _v4_partidas_actualizada),
+]
+
+
+def _aplicar(cursor, timeout_lock):
+    cursor.execute("SELECT GET_LOCK('lavieja_migraciones', %s)", (timeout_lock,))
+    if cursor.fetchone()[0] != 1:
+        raise RuntimeError("Otro proceso está migrando el esquema")
+    try:
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT NOT NULL PRIMARY KEY,
+            aplicada TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+        cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        actual = cursor.fetchone()[0]
+        aplicadas = []
+        for version, migracion in MIGRACIONES:
+            if version <= actual:
+                continue
+            print(f"Aplicando migración {version}: {migracion.__doc__}")
+            migracion(cursor)
+            cursor.execute("INSERT INTO schema_version (version) VALUES (%s)", (version,))
+            # El DDL de MySQL confirma implícitamente; se confirma también el registro
+            cursor.execute("COMMIT")
+            aplicadas.append(version)
+        return aplicadas
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK('lavieja_migraciones')")
+        cursor.fetchall()
+
+
+async def aplicar(db, timeout_lock=60):
+    """Lleva el esquema a la última versión; devuelve las versiones aplicadas."""
+    return await db.transaccion(lambda cursor: _aplicar(cursor, timeout_lock), timeout=timeout_lock + 300)
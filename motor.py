@@ -0,0 +1,98 @@
+import busqueda
+from tablero import VARIANTES
+
+# Núcleo del juego sin dependencias de discord.py: tablero, reglas y
+# políticas del bot por dificultad. Las vistas de Discord solo traducen
+# clics y mensajes a llamadas de este módulo, lo que permite medir y
+# perfilar el juego de forma aislada (ver benchmark.py).
+
+VICTORIA = "victoria"
+EMPATE = "empate"
+
+DIFICULTADES = ("facil", "medio", "dificil")
+
+
+def rival(ficha):
+    return "O" if ficha == "X" else "X"
+
+
+class TicTacToeGame:
+    # Sin __dict__: cada partida en memoria ocupa solo estos atributos
+    __slots__ = (
+        "guild_id", "variante", "x", "o", "jugador_actual", "modo_vs_bot",
+        "partida_activa", "jugadores", "dificultad", "bot_marker"
+    )
+
+    def __init__(self, guild_id, dificultad="dificil", variante="3x3"):
+        self.guild_id = guild_id
+        self.variante = VARIANTES[variante]  # Tamaño del tablero y fichas en raya
+        self.x = 0  # Bitboard de las fichas X
+        self.o = 0  # Bitboard de las fichas O
+        self.jugador_actual = "X"  # Se sobreescribirá según la selección
+        self.modo_vs_bot = False
+        self.partida_activa = False
+        self.jugadores = {}
+        self.dificultad = dificultad  # "facil", "medio", "dificil"
+        self.bot_marker = None  # Se asigna al iniciar partida vs bot
+
+    @property
+    def tablero(self):
+        """Tablero en el formato de texto de la tabla partidas."""
+        return self.variante.a_texto(self.x, self.o)
+
+    @tablero.setter
+    def tablero(self, texto):
+        self.x, self.o = self.variante.desde_texto(texto)
+
+    def libre(self, index):
+        return not (self.x | self.o) & self.variante.casillas[index]
+
+    def lleno(self):
+        return self.x | self.o == self.variante.lleno
+
+    def marcar(self, index, ficha):
+        if ficha == "X":
+            self.x |= self.variante.casillas[index]
+        else:
+            self.o |= self.variante.casillas[index]
+
+    def verificar_ganador(self):
+        return self.variante.hay_linea(self.x) or self.variante.hay_linea(self.o)
+
+    # Reglas
+
+    def fichas_bot(self):
+        """Devuelve (ficha del bot, ficha del humano)."""
+        if self.modo_vs_bot and self.bot_marker:
+            return self.bot_marker, rival(self.bot_marker)
+        return "O", "X"
+
+    def jugar(self, index):
+        """Coloca la ficha del jugador actual. Devuelve False si la casilla está ocupada."""
+        if not self.libre(index):
+            return False
+        self.marcar(index, self.jugador_actual)
+        return True
+
+    def cambiar_turno(self):
+        self.jugador_actual = rival(self.jugador_actual)
+
+    def resultado(self):
+        """VICTORIA si hay una línea completa, EMPATE si el tablero está lleno, o None."""
+        if self.verificar_ganador():
+            return VICTORIA
+        if self.lleno():
+            return EMPATE
+        return None
+
+    def terminar(self):
+        self.partida_activa = False
+
+
+def jugada_bot(game):
+    """Política del bot para la dificultad de la partida (cálculo síncrono)."""
+    bot_marker, _ = game.fichas_bot()
+    jugada, _ = busqueda.elegir_jugada(
+        game.variante.nombre, game.x, game.o, bot_marker, game.dificultad.lower()
+    )
+    return jugada
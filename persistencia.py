@@ -0,0 +1,161 @@
+import time
+
+from escritura import EscrituraDiferida
+from metricas import cronometrado
+from motor import TicTacToeGame
+from tablero import variante_de_tamano
+
+# Persistencia diferida (write-behind) de la tabla partidas.
+# Las partidas modificadas se marcan como pendientes y se escriben en lotes
+# a través del pool de la base de datos: solo las filas cambiadas, con un
+# DELETE agrupado por message_id para las partidas terminadas y un INSERT
+# múltiple que reemplaza las modificadas, dentro de la misma transacción.
+#
+# Cada fila guarda el tablero como dos bitboards y el tamaño, y a los
+# jugadores por su ID de Discord (ver migraciones.py).
+#
+# Las partidas solo se cargan al recibir un clic, así que las que estaban en
+# curso al apagar el bot y nadie vuelve a tocar no pasan por el registro en
+# memoria. Cada fila guarda el instante de su última actividad (las jugadas
+# van al registro de movimientos, así que se refresca con un UPDATE agrupado
+# por cada lote de partidas con jugadas nuevas), y las que llevan más de ttl
+# segundos sin actividad se borran periódicamente.
+
+COLUMNAS_PARTIDA = (
+    "message_id, guild_id, x, o, tamano, jugador_actual, modo_vs_bot, "
+    "partida_activa, jugador_x, jugador_o, dificultad, actualizada"
+)
+
+INSERT_PARTIDA = f"""
+INSERT INTO partidas ({COLUMNAS_PARTIDA})
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+ON DUPLICATE KEY UPDATE
+    x = VALUES(x), o = VALUES(o), jugador_actual = VALUES(jugador_actual),
+    partida_activa = VALUES(partida_activa), actualizada = VALUES(actualizada)
+"""
+
+
+def id_de_mencion(mencion):
+    """ID de usuario de una mención <@id> o <@!id>."""
+    return int(mencion.strip("<@!>"))
+
+
+def fila_partida(message_id, game, actualizada=0):
+    """Convierte una partida en la fila que se guarda en la tabla partidas."""
+    return (
+        message_id, game.guild_id, game.x, game.o, game.variante.n,
+        game.jugador_actual, game.modo_vs_bot, game.partida_activa,
+        id_de_mencion(game.jugadores["X"]), id_de_mencion(game.jugadores["O"]),
+        game.dificultad, actualizada
+    )
+
+
+def partida_desde_fila(row, bot_id=None):
+    """Reconstruye una partida a partir de una fila con las columnas COLUMNAS_PARTIDA.
+
+    bot_id es el ID del bot: en las partidas contra él, su ficha es la del
+    jugador con ese ID.
+    """
+    (_, guild_id, x, o, tamano, jugador_actual, modo_vs_bot,
+     partida_activa, jugador_x, jugador_o, dificultad, _) = row
+    game = TicTacToeGame(guild_id=guild_id, dificultad=dificultad, variante=variante_de_tamano(tamano).nombre)
+    game.x = x
+    game.o = o
+    game.jugador_actual = jugador_actual
+    game.modo_vs_bot = bool(modo_vs_bot)
+    game.partida_activa = bool(partida_activa)
+    game.jugadores = {"X": f"<@{jugador_x}>", "O": f"<@{jugador_o}>"}
+    if game.modo_vs_bot:
+        game.bot_marker = "X" if jugador_x == bot_id else "O"
+    return game
+
+
+class PersistenciaPartidas(EscrituraDiferida):
+    descripcion = "partidas"
+
+    def __init__(self, db, intervalo=2.0, lote=50, ttl=None, intervalo_purga=60.0):
+        super().__init__(db, intervalo, lote)
+        self.ttl = ttl  # Segundos sin escrituras tras los que una fila se borra; None: nunca
+        self.intervalo_purga = intervalo_purga  # Segundos entre borrados de filas caducadas; None: los hace otro proceso
+        self._ultima_purga = time.monotonic()
+        self._pendientes = {}  # message_id -> partida, o None si hay que borrarla
+        self._activas = set()  # message_id de partidas con jugadas desde la última escritura
+
+    def guardar(self, message_id, game):
+        """Marca una partida como modificada."""
+        self._pendientes[message_id] = game
+        self._avisar(len(self._pendientes))
+
+    def eliminar(self, message_id):
+        """Marca una partida para borrarla de la base de datos."""
+        self._pendientes[message_id] = None
+        self._avisar(len(self._pendientes))
+
+    def tocar(self, message_id):
+        """Marca actividad en una partida para que su fila no caduque."""
+        self._activas.add(message_id)
+
+    async def _tras_flush(self):
+        if not self.ttl or self.intervalo_purga is None:
+            return
+        if time.monotonic() - self._ultima_purga >= self.intervalo_purga:
+            self._ultima_purga = time.monotonic()
+            try:
+                await self.purgar()
+            except Exception as e:
+                print("Error al borrar partidas caducadas:", e)
+
+    async def cargar(self, message_id, bot_id=None):
+        """Lee una partida de la base de datos, teniendo en cuenta los cambios sin escribir."""
+        if message_id in self._pendientes:
+            return self._pendientes[message_id]  # None si está pendiente de borrar
+        row = await self.db.uno(
+            f"SELECT {COLUMNAS_PARTIDA} FROM partidas WHERE message_id = %s AND actualizada >= %s",
+            (message_id, self._limite())
+        )
+        return partida_desde_fila(row, bot_id) if row is not None else None
+
+    def _limite(self):
+        # Instante de escritura a partir del cual una fila sigue vigente
+        return int(time.time() - self.ttl) if self.ttl else 0
+
+    async def purgar(self):
+        """Borra las partidas sin escrituras desde hace más de ttl segundos."""
+        return await self.db.ejecutar("DELETE FROM partidas WHERE actualizada < %s", (self._limite(),))
+
+    @cronometrado("flush_partidas")
+    async def _vaciar(self):
+        if not self._pendientes and not self._activas:
+            return
+        pendientes, self._pendientes = self._pendientes, {}
+        activas, self._activas = self._activas, set()
+        # Las filas se construyen en el event loop para no leer partidas
+        # que se estén modificando desde otro hilo
+        ahora = int(time.time())
+        filas = [fila_partida(mid, game, ahora) for mid, game in pendientes.items() if game is not None]
+        # Las que se reescriben o se borran no necesitan refrescarse
+        tocadas = [mid for mid in activas if mid not in pendientes]
+        try:
+            message_ids = [mid for mid, game in pendientes.items() if game is None]
+            await self.db.transaccion(lambda cursor: self._escribir(cursor, message_ids, filas, tocadas, ahora))
+        except Exception:
+            # Reencolar lo que no haya sido reemplazado por un cambio más reciente
+            for mid, game in pendientes.items():
+                self._pendientes.setdefault(mid, game)
+            self._activas |= activas
+            raise
+
+    def _escribir(self, cursor, message_ids, filas, tocadas=(), ahora=0):
+        for i in range(0, len(message_ids), self.lote):
+            bloque = message_ids[i:i + self.lote]
+            marcadores = ", ".join(["%s"] * len(bloque))
+            cursor.execute(f"DELETE FROM partidas WHERE message_id IN ({marcadores})", bloque)
+        if filas:
+            cursor.executemany(INSERT_PARTIDA, filas)
+        for i in range(0, len(tocadas), self.lote):
+            bloque = tocadas[i:i + self.lote]
+            marcadores = ", ".join(["%s"] * len(bloque))
+            cursor.execute(
+                f"UPDATE partidas SET actualizada = %s WHERE message_id IN ({marcadores})", (ahora, *bloque)
+            )
+
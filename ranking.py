@@ -0,0 +1,107 @@
+import random
+
+# Índice de posiciones para la tabla de posiciones de cada servidor.
+# Es una skip list indexable: cada enlace guarda cuántos elementos salta, de
+# modo que insertar, eliminar, calcular la posición de una clave y llegar al
+# elemento k-ésimo cuestan O(log n), y una página de K elementos O(log n + K).
+
+MAX_NIVELES = 24
+
+
+class _Nodo:
+    __slots__ = ("clave", "siguientes", "anchos")
+
+    def __init__(self, clave, niveles):
+        self.clave = clave
+        self.siguientes = [None] * niveles
+        self.anchos = [1] * niveles
+
+
+class IndiceRanking:
+    def __init__(self, claves=()):
+        # La cabeza ocupa la posición 0; el elemento i-ésimo, la posición i + 1.
+        # Un enlace a None mide la distancia hasta el final de la lista.
+        self._cabeza = _Nodo(None, MAX_NIVELES)
+        self._tamano = 0
+        for clave in sorted(claves):
+            self.insertar(clave)
+
+    def __len__(self):
+        return self._tamano
+
+    def __iter__(self):
+        nodo = self._cabeza.siguientes[0]
+        while nodo is not None:
+            yield nodo.clave
+            nodo = nodo.siguientes[0]
+
+    def _buscar(self, clave):
+        # Último nodo de cada nivel con clave menor, y su posición
+        anteriores = [None] * MAX_NIVELES
+        posiciones = [0] * MAX_NIVELES
+        nodo = self._cabeza
+        posicion = 0
+        for nivel in reversed(range(MAX_NIVELES)):
+            siguiente = nodo.siguientes[nivel]
+            while siguiente is not None and siguiente.clave < clave:
+                posicion += nodo.anchos[nivel]
+                nodo = siguiente
+                siguiente = nodo.siguientes[nivel]
+            anteriores[nivel] = nodo
+            posiciones[nivel] = posicion
+        return anteriores, posiciones
+
+    def insertar(self, clave):
+        anteriores, posiciones = self._buscar(clave)
+        nueva_posicion = posiciones[0] + 1
+        niveles = 1
+        while niveles < MAX_NIVELES and random.random() < 0.5:
+            niveles += 1
+        nuevo = _Nodo(clave, niveles)
+        for nivel in range(MAX_NIVELES):
+            anterior = anteriores[nivel]
+            if nivel < niveles:
+                salto = nueva_posicion - posiciones[nivel]
+                nuevo.siguientes[nivel] = anterior.siguientes[nivel]
+                nuevo.anchos[nivel] = anterior.anchos[nivel] - salto + 1
+                anterior.siguientes[nivel] = nuevo
+                anterior.anchos[nivel] = salto
+            else:
+                anterior.anchos[nivel] += 1
+        self._tamano += 1
+
+    def eliminar(self, clave):
+        anteriores, _ = self._buscar(clave)
+        objetivo = anteriores[0].siguientes[0]
+        if objetivo is None or objetivo.clave != clave:
+            raise KeyError(clave)
+        for nivel in range(MAX_NIVELES):
+            anterior = anteriores[nivel]
+            if anterior.siguientes[nivel] is objetivo:
+                anterior.anchos[nivel] += objetivo.anchos[nivel] - 1
+                anterior.siguientes[nivel] = objetivo.siguientes[nivel]
+            else:
+                anterior.anchos[nivel] -= 1
+        self._tamano -= 1
+
+    def posicion(self, clave):
+        """Número de elementos estrictamente menores que la clave."""
+        _, posiciones = self._buscar(clave)
+        return posiciones[0]
+
+    def pagina(self, inicio, cantidad):
+        """Los elementos desde la posición inicio (base 0), como mucho cantidad."""
+        if inicio < 0 or inicio >= self._tamano or cantidad <= 0:
+            return []
+        objetivo = inicio + 1
+        nodo = self._cabeza
+        posicion = 0
+        for nivel in reversed(range(MAX_NIVELES)):
+            while nodo.siguientes[nivel] is not None and posicion + nodo.anchos[nivel] <= objetivo:
+                posicion += nodo.anchos[nivel]
+                nodo = nodo.siguientes[nivel]
+        resultado = []
+        while nodo is not None and len(resultado) < cantidad:
+            resultado.append(nodo.clave)
+            nodo = nodo.siguientes[0]
+        return resultado
@@ -0,0 +1,134 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+from metricas import Contador
+
+# Registro de partidas en memoria con ciclo de vida acotado.
+# Las partidas se guardan en orden de último uso: insertar o acceder a una
+# partida la mueve al final, de modo que las más antiguas siempre están al
+# principio. Así, expulsar por tamaño máximo (LRU) y expirar por inactividad
+# (TTL) solo recorren las partidas que realmente se van.
+#
+# Cada expulsión llama a al_expulsar(message_id, game, motivo), que se encarga
+# de liberar lo asociado a la partida (fila en MySQL, búsquedas, ediciones).
+
+PARTIDAS_EXPULSADAS = Contador(
+    "lavieja_partidas_expulsadas_total", "Partidas retiradas de memoria sin terminar.", ("motivo",)
+)
+
+
+class RegistroPartidas:
+    def __init__(self, maximo=10000, ttl=900.0, intervalo=60.0, al_expulsar=None):
+        self.maximo = maximo  # Partidas en memoria como mucho
+        self.ttl = ttl  # Segundos sin actividad tras los que una partida expira
+        self.intervalo = intervalo  # Segundos entre barridos de partidas expiradas
+        self.al_expulsar = al_expulsar
+        self._partidas = OrderedDict()  # message_id -> partida, de la menos a la más usada
+        self._usos = {}  # message_id -> instante del último uso
+        self._tarea = None
+
+    def __len__(self):
+        return len(self._partidas)
+
+    def __iter__(self):
+        return iter(list(self._partidas))
+
+    def values(self):
+        """Partidas en memoria, sin marcarlas como usadas."""
+        return list(self._partidas.values())
+
+    def items(self):
+        """Pares (message_id, partida) de la menos a la más usada, sin marcarlas."""
+        return list(self._partidas.items())
+
+    def consultar(self, message_id):
+        """Partida sin marcarla como usada, o None."""
+        return self._partidas.get(message_id)
+
+    def inactividad(self, message_id):
+        """Segundos desde el último uso de una partida."""
+        return time.monotonic() - self._usos[message_id]
+
+    def __contains__(self, message_id):
+        return message_id in self._partidas
+
+    def __getitem__(self, message_id):
+        game = self._partidas[message_id]
+        self.tocar(message_id)
+        return game
+
+    def get(self, message_id, default=None):
+        if message_id not in self._partidas:
+            return default
+        return self[message_id]
+
+    def __setitem__(self, message_id, game):
+        self._partidas[message_id] = game
+        self.tocar(message_id)
+        while len(self._partidas) > self.maximo:
+            self.expulsar(next(iter(self._partidas)), "lru")
+
+    def __delitem__(self, message_id):
+        del self._partidas[message_id]
+        del self._usos[message_id]
+
+    def pop(self, message_id, *default):
+        if message_id not in self._partidas:
+            if default:
+                return default[0]
+            raise KeyError(message_id)
+        del self._usos[message_id]
+        return self._partidas.pop(message_id)
+
+    def tocar(self, message_id):
+        """Marca actividad en una partida: la aleja de la expiración y de la expulsión."""
+        if message_id in self._partidas:
+            self._partidas.move_to_end(message_id)
+            self._usos[message_id] = time.monotonic()
+
+    def expulsar(self, message_id, motivo):
+        """Retira una partida sin terminar y avisa a al_expulsar."""
+        game = self.pop(message_id, None)
+        if game is None:
+            return
+        PARTIDAS_EXPULSADAS.inc(motivo=motivo)
+        if self.al_expulsar is not None:
+            try:
+                self.al_expulsar(message_id, game, motivo)
+            except Exception as e:
+                print("Error al expulsar partida:", e)
+
+    def expirar(self):
+        """Expulsa las partidas inactivas durante más de ttl segundos."""
+        limite = time.monotonic() - self.ttl
+        expiradas = []
+        for message_id in self._partidas:
+            if self._usos[message_id] > limite:
+                break  # El resto se ha usado más recientemente
+            expiradas.append(message_id)
+        for message_id in expiradas:
+            self.expulsar(message_id, "ttl")
+        return len(expiradas)
+
+    async def iniciar(self):
+        """Arranca el barrido periódico de partidas expiradas."""
+        if self._tarea is None:
+            self._tarea = asyncio.create_task(self._bucle())
+
+    async def _bucle(self):
+        while True:
+            await asyncio.sleep(self.intervalo)
+            try:
+                self.expirar()
+            except Exception as e:
+                print("Error al expirar partidas:", e)
+
+    async def cerrar(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
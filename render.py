@@ -0,0 +1,89 @@
+from functools import lru_cache
+
+import discord
+
+# Presentación de las partidas en Discord.
+# Lo que no cambia entre turnos se construye una sola vez: el aspecto de cada
+# casilla según su ficha y los embeds de turno de cada pareja de jugadores,
+# que solo se diferencian en de quién es el turno. Cada tablero guarda sus
+# filas de botones ya serializadas y una jugada reescribe solo la casilla que
+# cambió. Los embeds se comparten entre mensajes: no se deben modificar.
+
+FICHAS = {"X": "❎", "O": "🅾️", " ": "⬜"}
+
+ESTILOS = {
+    "X": discord.ButtonStyle.success,
+    "O": discord.ButtonStyle.danger,
+    " ": discord.ButtonStyle.secondary,
+}
+
+# Campos del botón de una casilla según su contenido (formato de la API)
+ASPECTO_CASILLA = {
+    ficha: {"style": estilo.value, "disabled": ficha != " ", "label": FICHAS[ficha]}
+    for ficha, estilo in ESTILOS.items()
+}
+
+EMBEDS_EN_CACHE = 4096  # Combinaciones de jugadores, turno e inicio guardadas
+
+EMBED_FIN = discord.Embed(
+    title="Juego terminado",
+    description="Selecciona una opción:",
+    color=discord.Color.purple()
+)
+
+EMBED_TERMINADA = discord.Embed(
+    title="Juego terminado",
+    description="La partida se ha terminado.",
+    color=discord.Color.purple()
+)
+
+
+def custom_id_casilla(message_id, index):
+    """custom_id del botón de una casilla; lo interpreta CasillaBoton en bot.py."""
+    return f"lavieja:{message_id}:{index}"
+
+
+@lru_cache(maxsize=EMBEDS_EN_CACHE)
+def embed_turno(jugador_x, jugador_o, turno, inicio=False):
+    """Embed del tablero con el turno de la ficha indicada."""
+    jugadores = {"X": jugador_x, "O": jugador_o}
+    return discord.Embed(
+        title="🎲 ¡Tres en raya!",
+        description=(
+            f"{jugador_x} vs {jugador_o}\n\n"
+            + ("🎮 ¡QUE COMIENCE EL JUEGO! 🎮\n\n" if inicio else "")
+            + f"🔄 Turno de {jugadores[turno]} con {FICHAS[turno]}!"
+        ),
+        color=discord.Color.blue()
+    )
+
+
+def embed_tiempo_agotado(ganador, perdedor):
+    """Embed del tablero de una partida perdida por agotar el turno."""
+    return discord.Embed(
+        title="⌛ ¡Tiempo agotado!",
+        description=f"{perdedor} no jugó a tiempo.\n\n🏆 ¡{ganador} gana la partida!\n📊 Estadísticas actualizadas.",
+        color=discord.Color.purple()
+    )
+
+
+class BotonesTablero:
+    """Filas de botones de un tablero, listas para enviar como componentes."""
+
+    def __init__(self, message_id, variante, tablero):
+        n = variante.n
+        self.casillas = [
+            {"type": 2, **ASPECTO_CASILLA[tablero[i]], "custom_id": custom_id_casilla(message_id, i)}
+            for i in range(variante.total)
+        ]
+        self.filas = [
+            {"type": 1, "components": self.casillas[fila * n:(fila + 1) * n]}
+            for fila in range(n)
+        ]
+
+    def marcar(self, index, ficha):
+        self.casillas[index].update(ASPECTO_CASILLA[ficha])
+
+    def desactivar(self):
+        for casilla in self.casillas:
+            casilla["disabled"] = True
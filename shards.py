@@ -0,0 +1,41 @@
+# Reparto de servidores entre procesos.
+# Discord asigna cada servidor a un shard con (guild_id >> 22) % shard_count.
+# Cada proceso del bot conecta solo sus shards (SHARD_IDS) y, con el mismo
+# cálculo, carga de MySQL solo los datos de sus servidores. Las tareas
+# globales (sincronizar comandos, borrar partidas caducadas) solo las hace el
+# proceso que tiene el shard 0.
+
+
+def shard_de(guild_id, total):
+    return (guild_id >> 22) % total
+
+
+class Particion:
+    def __init__(self, total=None, ids=None):
+        self.total = total  # None: un solo proceso con todos los servidores
+        self.ids = frozenset(ids) if ids is not None else None  # None: todos los shards
+
+    @classmethod
+    def desde_texto(cls, total, ids):
+        """Particion a partir de SHARD_COUNT y SHARD_IDS ("0,1,2" o vacío)."""
+        total = int(total) if total else None
+        ids = [int(i) for i in ids.split(",") if i.strip()] if ids else None
+        if ids is not None and total is None:
+            raise ValueError("SHARD_IDS requiere SHARD_COUNT")
+        return cls(total, ids)
+
+    @property
+    def completa(self):
+        return self.total is None or self.ids is None
+
+    @property
+    def principal(self):
+        """Si este proceso tiene el shard 0 y se encarga de las tareas globales."""
+        return self.completa or 0 in self.ids
+
+    def sql(self, columna="guild_id"):
+        """Condición WHERE y parámetros para filtrar los servidores de la partición."""
+        if self.completa:
+            return "1 = 1", ()
+        marcadores = ", ".join(["%s"] * len(self.ids))
+        return f"MOD({columna} >> 22, %s) IN ({marcadores})", (self.total, *sorted(self.ids))
@@ -0,0 +1,112 @@
+from tablero import VARIANTES
+
+# Simetrías del tablero cuadrado.
+# Las 4 rotaciones y 4 reflexiones de un tablero de n x n conservan las líneas
+# ganadoras, así que las 8 posiciones equivalentes tienen el mismo valor. La
+# forma canónica de una posición es la menor de sus 8 imágenes; las tablas y
+# cachés del bot se indexan por ella y guardan las jugadas en el marco
+# canónico, que se deshace con la transformación inversa.
+
+# (fila, columna) -> (fila, columna) en un tablero de lado n
+TRANSFORMACIONES = (
+    lambda f, c, n: (f, c),                  # Identidad
+    lambda f, c, n: (c, n - 1 - f),          # Giro de 90°
+    lambda f, c, n: (n - 1 - f, n - 1 - c),  # Giro de 180°
+    lambda f, c, n: (n - 1 - c, f),          # Giro de 270°
+    lambda f, c, n: (f, n - 1 - c),          # Espejo horizontal
+    lambda f, c, n: (n - 1 - f, c),          # Espejo vertical
+    lambda f, c, n: (c, f),                  # Diagonal
+    lambda f, c, n: (n - 1 - c, n - 1 - f),  # Antidiagonal
+)
+
+BLOQUE = 9
+MASCARA_BLOQUE = (1 << BLOQUE) - 1
+
+
+class Simetrias:
+    """Las 8 simetrías de una variante, aplicadas a bitboards y a casillas."""
+
+    def __init__(self, variante):
+        self.variante = variante
+        n = variante.n
+        # permutaciones[t][i]: casilla a la que la transformación t lleva la casilla i
+        self.permutaciones = tuple(
+            tuple(f * n + c for f, c in (t(i // n, i % n, n) for i in range(variante.total)))
+            for t in TRANSFORMACIONES
+        )
+        self.inversas = tuple(
+            next(u for u, q in enumerate(self.permutaciones) if all(q[p[i]] == i for i in range(variante.total)))
+            for p in self.permutaciones
+        )
+        # Transformar un bitboard por bloques de BLOQUE bits: tablas[t][b][valor del bloque b]
+        # (el tablero de 3x3 cabe en un solo bloque)
+        bloques = (variante.total + BLOQUE - 1) // BLOQUE
+        self._tablas = tuple(
+            tuple(
+                tuple(
+                    sum(
+                        1 << p[BLOQUE * b + j] for j in range(BLOQUE)
+                        if valor >> j & 1 and BLOQUE * b + j < variante.total
+                    )
+                    for valor in range(1 << BLOQUE)
+                )
+                for b in range(bloques)
+            )
+            for p in self.permutaciones
+        )
+        # Las mismas tablas con las 8 imágenes empaquetadas: cada bloque de x o de o
+        # da de una vez su parte de las 8 claves, en campos de 2 * total bits
+        total = variante.total
+        self._desplazamientos = tuple(2 * total * t for t in range(len(TRANSFORMACIONES)))
+        self._mascara_clave = (1 << 2 * total) - 1
+        self._empaquetadas = tuple(
+            tuple(
+                tuple(
+                    sum(
+                        tablas[b][valor] << d + desplazamiento
+                        for tablas, d in zip(self._tablas, self._desplazamientos)
+                    )
+                    for valor in range(1 << BLOQUE)
+                )
+                for desplazamiento in (total, 0)
+            )
+            for b in range(bloques)
+        )
+
+    def aplicar(self, t, bits):
+        """Imagen de un bitboard por la transformación t."""
+        resultado = 0
+        for tabla in self._tablas[t]:
+            resultado |= tabla[bits & MASCARA_BLOQUE]
+            bits >>= BLOQUE
+        return resultado
+
+    def canonica(self, x, o):
+        """Devuelve (x, o, t): la forma canónica y la transformación que lleva a ella."""
+        total = self.variante.total
+        # Un entero con las 8 claves (x << total | o) de las imágenes, una por campo
+        claves = 0
+        for tabla_x, tabla_o in self._empaquetadas:
+            claves |= tabla_x[x & MASCARA_BLOQUE] | tabla_o[o & MASCARA_BLOQUE]
+            x >>= BLOQUE
+            o >>= BLOQUE
+        mascara = self._mascara_clave
+        imagenes = [claves >> d & mascara for d in self._desplazamientos]
+        clave = min(imagenes)
+        return clave >> total, clave & self.variante.lleno, imagenes.index(clave)
+
+    def clave(self, x, o):
+        """Entero único de la forma canónica, para indexar tablas."""
+        cx, co, _ = self.canonica(x, o)
+        return cx << self.variante.total | co
+
+    def casilla(self, t, i):
+        """Casilla i llevada al marco de la transformación t."""
+        return self.permutaciones[t][i]
+
+    def deshacer(self, t, i):
+        """Casilla del marco de t devuelta al tablero original."""
+        return self.permutaciones[self.inversas[t]][i]
+
+
+SIMETRIAS = {nombre: Simetrias(variante) for nombre, variante in VARIANTES.items()}
@@ -0,0 +1,481 @@
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import random
+import threading
+import time
+import tracemalloc
+
+from discord import app_commands
+
+import bot as aplicacion
+from db import BaseDeDatos
+from motor import DIFICULTADES
+from tablero import VARIANTES
+
+# Simulación de carga sin Discord ni MySQL.
+# Recorre el flujo real del bot (/start -> TokenSelectionView ->
+# iniciar_partida -> TicTacToeView.handle_click -> GameEndView.reiniciar)
+# con interacciones, canales y mensajes simulados que imitan la latencia de
+# la API de Discord, y una base de datos simulada que sustituye a las
+# conexiones de MySQL pero conserva el pool de hilos, los reintentos y las
+# métricas de BaseDeDatos. Al terminar informa de la latencia de las
+# interacciones (p50/p99), el retraso del event loop, las consultas a la base
+# de datos por partida y la memoria por partida activa:
+#
+#   python simulacion.py --partidas 2000 --latencia-discord 0.05
+#   python simulacion.py --partidas 500 --humanos 0.3 --revanchas 0.5 --json sim.json
+
+SEMILLA = 1234
+
+_ids = itertools.count(10**17)  # Snowflakes simulados
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+# Base de datos simulada
+
+
+class _CursorSimulado:
+    def __init__(self, db):
+        self.db = db
+        self.rowcount = 0
+
+    def execute(self, sql, params=()):
+        self.db._registrar(sql, 1)
+
+    def executemany(self, sql, filas):
+        filas = list(filas)
+        self.db._registrar(sql, len(filas))
+        self.rowcount = len(filas)
+
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class _ConexionSimulada:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self):
+        return _CursorSimulado(self.db)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class BaseDeDatosSimulada(BaseDeDatos):
+    """BaseDeDatos cuyas conexiones solo cuentan sentencias y esperan la latencia indicada."""
+
+    def __init__(self, latencia=0.002, **kwargs):
+        super().__init__(**kwargs)
+        self.latencia = latencia  # Segundos por sentencia (ida y vuelta a MySQL)
+        self.sentencias = {}  # Primera palabra del SQL -> número de sentencias
+        self.filas = 0
+        self.transacciones = 0
+        self._lock_contadores = threading.Lock()
+
+    def _obtener_pool(self):
+        return self
+
+    def get_connection(self):
+        with self._lock_contadores:
+            self.transacciones += 1
+        return _ConexionSimulada(self)
+
+    def _registrar(self, sql, filas):
+        if self.latencia > 0:
+            time.sleep(self.latencia)
+        tipo = sql.split(None, 1)[0].upper()
+        with self._lock_contadores:
+            self.sentencias[tipo] = self.sentencias.get(tipo, 0) + 1
+            self.filas += filas
+
+
+# Capa de Discord simulada
+
+
+class UsuarioSimulado:
+    def __init__(self, nombre):
+        self.id = next(_ids)
+        self.mention = f"<@{self.id}>"
+        self.display_name = nombre
+        self.name = nombre
+
+
+class ServidorSimulado:
+    def __init__(self):
+        self.id = next(_ids)
+        self.miembros = {}
+
+    def get_member(self, user_id):
+        return self.miembros.get(user_id)
+
+
+class MensajeSimulado:
+    def __init__(self, simulacion, canal, content=None, embed=None, view=None):
+        self.simulacion = simulacion
+        self.id = next(_ids)
+        self.channel = canal
+        self.content = content
+        self.embed = embed
+        self.view = view
+
+    async def edit(self, content=None, embed=None, view=None):
+        await self.simulacion.llamada_api("message.edit")
+        if content is not None:
+            self.content = content
+        if embed is not None:
+            self.embed = embed
+        if view is not None:
+            self.view = view
+        return self
+
+    async def reply(self, content=None, embed=None, view=None):
+        await self.simulacion.llamada_api("message.reply")
+        return self.channel._publicar(content, embed, view)
+
+
+class CanalSimulado:
+    def __init__(self, simulacion, guild):
+        self.simulacion = simulacion
+        self.id = next(_ids)
+        self.guild = guild
+        self.mensajes = []
+
+    def _publicar(self, content=None, embed=None, view=None):
+        mensaje = MensajeSimulado(self.simulacion, self, content, embed, view)
+        self.mensajes.append(mensaje)
+        return mensaje
+
+    async def send(self, content=None, embed=None, view=None):
+        await self.simulacion.llamada_api("channel.send")
+        return self._publicar(content, embed, view)
+
+    def ultima_vista(self, tipo):
+        for mensaje in reversed(self.mensajes):
+            if isinstance(mensaje.view, tipo):
+                return mensaje, mensaje.view
+        return None, None
+
+
+class RespuestaSimulada:
+    def __init__(self, interaccion):
+        self.interaccion = interaccion
+        self.confirmada = None  # Momento de la primera respuesta
+
+    def is_done(self):
+        return self.confirmada is not None
+
+    def _confirmar(self):
+        if self.confirmada is not None:
+            raise RuntimeError("La interacción ya fue respondida")
+        self.confirmada = time.perf_counter()
+
+    async def defer(self, ephemeral=False, thinking=False):
+        self._confirmar()
+        await self.interaccion.simulacion.llamada_api("response.defer")
+
+    async def send_message(self, content=None, embed=None, view=None, ephemeral=False):
+        self._confirmar()
+        await self.interaccion.simulacion.llamada_api("response.send_message")
+        self.interaccion.respuestas.append(content)
+        self.interaccion.channel._publicar(content, embed, view)
+
+    async def edit_message(self, content=None, embed=None, view=None):
+        self._confirmar()
+        await self.interaccion.simulacion.llamada_api("response.edit_message")
+        await MensajeSimulado.edit(self.interaccion.message, content, embed, view)
+
+
+class SeguimientoSimulado:
+    def __init__(self, interaccion):
+        self.interaccion = interaccion
+
+    async def send(self, content=None, embed=None, view=None, ephemeral=False):
+        await self.interaccion.simulacion.llamada_api("followup.send")
+        return self.interaccion.channel._publicar(content, embed, view)
+
+
+class InteraccionSimulada:
+    def __init__(self, simulacion, user, canal, message=None):
+        self.simulacion = simulacion
+        self.id = next(_ids)
+        self.user = user
+        self.channel = canal
+        self.guild = canal.guild
+        self.message = message
+        self.response = RespuestaSimulada(self)
+        self.followup = SeguimientoSimulado(self)
+        self.respuestas = []  # Mensajes efímeros enviados al usuario
+        self.creada = time.perf_counter()
+
+    async def edit_original_response(self, content=None, embed=None, view=None):
+        await self.simulacion.llamada_api("edit_original_response")
+
+
+# Simulación
+
+
+class Simulacion:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.semilla)
+        self.db = BaseDeDatosSimulada(latencia=args.latencia_db, tamano=aplicacion.MYSQL_POOL)
+        self.bot_usuario = UsuarioSimulado("La Vieja")
+        self.latencias = {}  # Tipo de interacción -> segundos hasta terminar el handler
+        self.confirmaciones = []  # Segundos hasta la primera respuesta a Discord
+        self.retrasos_loop = []
+        self.llamadas_api = {}
+        self.rechazos = 0
+        self.errores = []
+        self.partidas_jugadas = 0
+        self.max_activas = 0
+
+    def preparar(self):
+        """Conecta el módulo del bot a la base de datos y al usuario simulados."""
+        aplicacion.db = self.db
+        aplicacion.persistencia.db = self.db
+        aplicacion.historial.db = self.db
+        aplicacion.estadisticas.db = self.db
+        aplicacion.bot._connection.user = self.bot_usuario
+        if self.args.retardo is not None:
+            aplicacion.BOT_RETARDO = self.args.retardo
+
+    async def llamada_api(self, tipo):
+        self.llamadas_api[tipo] = self.llamadas_api.get(tipo, 0) + 1
+        if self.args.latencia_discord > 0:
+            await asyncio.sleep(self.rng.expovariate(1 / self.args.latencia_discord))
+
+    async def pausa(self):
+        if self.args.pausa > 0:
+            await asyncio.sleep(self.rng.expovariate(1 / self.args.pausa))
+
+    async def interaccion(self, tipo, callback, interaccion, *args, **kwargs):
+        """Ejecuta un handler con una interacción simulada y mide su latencia."""
+        try:
+            await callback(interaccion, *args, **kwargs)
+        except Exception as e:
+            self.errores.append(f"{tipo}: {e!r}")
+        fin = time.perf_counter()
+        self.latencias.setdefault(tipo, []).append(fin - interaccion.creada)
+        if interaccion.response.confirmada is not None:
+            self.confirmaciones.append(interaccion.response.confirmada - interaccion.creada)
+        self.max_activas = max(self.max_activas, len(aplicacion.partidas))
+
+    async def vigilar_loop(self, intervalo=0.01):
+        while True:
+            inicio = time.perf_counter()
+            await asyncio.sleep(intervalo)
+            self.retrasos_loop.append(time.perf_counter() - inicio - intervalo)
+
+    async def partida(self):
+        """Una partida completa desde /start, con revanchas opcionales."""
+        guild = ServidorSimulado()
+        canal = CanalSimulado(self, guild)
+        jugador = UsuarioSimulado("jugador")
+        guild.miembros[jugador.id] = jugador
+        rival = None
+        if self.rng.random() < self.args.humanos:
+            rival = UsuarioSimulado("rival")
+            guild.miembros[rival.id] = rival
+        variante = self.rng.choice(self.args.variantes)
+        dificultad = None if rival else self.rng.choice(self.args.dificultades)
+
+        await asyncio.sleep(self.rng.uniform(0, self.args.rampa))
+        inicio = InteraccionSimulada(self, jugador, canal)
+        await self.interaccion(
+            "start", aplicacion.start.callback, inicio,
+            oponente=rival,
+            dificultad=app_commands.Choice(name=dificultad, value=dificultad) if dificultad else None,
+            variante=app_commands.Choice(name=variante, value=variante)
+        )
+        _, seleccion = canal.ultima_vista(aplicacion.TokenSelectionView)
+        if seleccion is None:
+            return
+        await self.pausa()
+        boton = self.rng.choice(seleccion.children)
+        await self.interaccion("ficha", boton.callback, InteraccionSimulada(self, jugador, canal))
+
+        while True:
+            mensaje, vista = canal.ultima_vista(aplicacion.TicTacToeView)
+            if vista is None:
+                return
+            await self.jugar(canal, mensaje, vista, {jugador.mention: jugador, rival and rival.mention: rival})
+            self.partidas_jugadas += 1
+            _, fin = canal.ultima_vista(aplicacion.GameEndView)
+            if fin is None or self.rng.random() >= self.args.revanchas:
+                return
+            await self.pausa()
+            fin_mensaje = canal.mensajes[-1]
+            await self.interaccion(
+                "reiniciar", fin.children[0].callback, InteraccionSimulada(self, jugador, canal, fin_mensaje)
+            )
+
+    async def jugar(self, canal, mensaje, vista, usuarios):
+        game = vista.game
+        while game.partida_activa:
+            user = usuarios.get(game.jugadores[game.jugador_actual])
+            if user is None:
+                # Turno del bot que aún no ha terminado de calcular
+                await asyncio.sleep(0.01)
+                continue
+            await self.pausa()
+            index = self.rng.choice(game.variante.libres(game.x, game.o))
+            antes = (game.x, game.o)
+            interaccion = InteraccionSimulada(self, user, canal, mensaje)
+            # Como en Discord: el clic llega por el elemento dinámico de la casilla
+            boton = aplicacion.CasillaBoton(vista.message_id, index)
+            await self.interaccion("click", boton.callback, interaccion)
+            if (game.x, game.o) == antes and game.partida_activa:
+                # Clic rechazado (bot saturado): se reintenta tras otra pausa
+                self.rechazos += 1
+                await asyncio.sleep(0.1)
+
+    async def medir_memoria(self, cantidad):
+        """Bytes por partida activa (partida, vista, fila pendiente y mensaje simulado)."""
+        guild = ServidorSimulado()
+        canal = CanalSimulado(self, guild)
+        latencia, self.args.latencia_discord = self.args.latencia_discord, 0
+        interacciones = []
+        gc.collect()
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        for _ in range(cantidad):
+            jugador = UsuarioSimulado("jugador")
+            interaccion = InteraccionSimulada(self, jugador, canal)
+            interacciones.append(interaccion)
+            await aplicacion.iniciar_partida(interaccion, None, "medio", "X", variante="3x3")
+        gc.collect()
+        ocupado = tracemalloc.get_traced_memory()[0] - base
+        tracemalloc.stop()
+        self.args.latencia_discord = latencia
+        for interaccion in interacciones:
+            aplicacion.partidas.pop(interaccion.id, None)
+            aplicacion.vistas.pop(interaccion.id, None)
+            aplicacion.persistencia.eliminar(interaccion.id)
+        return ocupado / cantidad
+
+    async def correr(self):
+        self.preparar()
+        await aplicacion.persistencia.iniciar()
+        await aplicacion.historial.iniciar()
+        await aplicacion.estadisticas.iniciar()
+        aplicacion.calculador.iniciar()
+        vigilante = asyncio.create_task(self.vigilar_loop())
+        inicio = time.perf_counter()
+        try:
+            await asyncio.gather(*(self.partida() for _ in range(self.args.partidas)))
+        finally:
+            duracion = time.perf_counter() - inicio
+            vigilante.cancel()
+            await aplicacion.persistencia.cerrar()
+            await aplicacion.historial.cerrar()
+            await aplicacion.estadisticas.cerrar()
+        memoria = await self.medir_memoria(self.args.muestra_memoria) if self.args.muestra_memoria else None
+        await aplicacion.persistencia.flush()
+        aplicacion.calculador.cerrar()
+        self.db.cerrar()
+        return self.informe(duracion, memoria)
+
+    def informe(self, duracion, memoria):
+        partidas = max(self.partidas_jugadas, 1)
+        todas = [s for valores in self.latencias.values() for s in valores]
+        return {
+            "partidas": self.partidas_jugadas,
+            "segundos": duracion,
+            "max_partidas_activas": self.max_activas,
+            "interacciones": len(todas),
+            "latencia_p50": percentil(todas, 50),
+            "latencia_p99": percentil(todas, 99),
+            "latencia_por_tipo": {
+                tipo: {"n": len(v), "p50": percentil(v, 50), "p99": percentil(v, 99)}
+                for tipo, v in sorted(self.latencias.items())
+            },
+            "confirmacion_p50": percentil(self.confirmaciones, 50),
+            "confirmacion_p99": percentil(self.confirmaciones, 99),
+            "retraso_loop_p50": percentil(self.retrasos_loop, 50),
+            "retraso_loop_p99": percentil(self.retrasos_loop, 99),
+            "retraso_loop_max": max(self.retrasos_loop, default=0.0),
+            "transacciones_por_partida": self.db.transacciones / partidas,
+            "sentencias_por_partida": sum(self.db.sentencias.values()) / partidas,
+            "sentencias": dict(self.db.sentencias),
+            "llamadas_api_por_partida": sum(self.llamadas_api.values()) / partidas,
+            "llamadas_api": dict(self.llamadas_api),
+            "clics_rechazados": self.rechazos,
+            "bytes_por_partida_activa": memoria,
+            "errores": len(self.errores),
+        }
+
+
+def imprimir(informe):
+    ms = lambda s: f"{s * 1000:.1f} ms"
+    print(f"Partidas jugadas:            {informe['partidas']} en {informe['segundos']:.1f} s "
+          f"(máx. {informe['max_partidas_activas']} activas)")
+    print(f"Latencia de interacción:     p50 {ms(informe['latencia_p50'])}  p99 {ms(informe['latencia_p99'])}")
+    for tipo, datos in informe["latencia_por_tipo"].items():
+        print(f"  {tipo:<26} p50 {ms(datos['p50'])}  p99 {ms(datos['p99'])}  ({datos['n']})")
+    print(f"Primera respuesta a Discord: p50 {ms(informe['confirmacion_p50'])}  p99 {ms(informe['confirmacion_p99'])}")
+    print(f"Retraso del event loop:      p50 {ms(informe['retraso_loop_p50'])}  p99 {ms(informe['retraso_loop_p99'])}"
+          f"  máx {ms(informe['retraso_loop_max'])}")
+    print(f"Base de datos por partida:   {informe['transacciones_por_partida']:.2f} transacciones, "
+          f"{informe['sentencias_por_partida']:.2f} sentencias {informe['sentencias']}")
+    print(f"Llamadas a Discord:          {informe['llamadas_api_por_partida']:.2f} por partida {informe['llamadas_api']}")
+    print(f"Clics rechazados:            {informe['clics_rechazados']}")
+    if informe["bytes_por_partida_activa"] is not None:
+        print(f"Memoria por partida activa:  {informe['bytes_por_partida_activa'] / 1024:.1f} KiB")
+    print(f"Errores:                     {informe['errores']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulación de carga de La Vieja.")
+    parser.add_argument("--partidas", type=int, default=1000, help="Partidas simultáneas.")
+    parser.add_argument("--rampa", type=float, default=5.0, help="Segundos en los que se reparten los /start.")
+    parser.add_argument("--pausa", type=float, default=0.5, help="Segundos medios que piensa cada jugador.")
+    parser.add_argument("--humanos", type=float, default=0.2, help="Fracción de partidas entre dos usuarios.")
+    parser.add_argument("--revanchas", type=float, default=0.3, help="Probabilidad de pulsar Reiniciar al terminar.")
+    parser.add_argument("--variantes", nargs="+", default=list(VARIANTES), choices=list(VARIANTES))
+    parser.add_argument("--dificultades", nargs="+", default=list(DIFICULTADES), choices=list(DIFICULTADES))
+    parser.add_argument("--latencia-discord", type=float, default=0.05, help="Segundos medios por llamada a Discord.")
+    parser.add_argument("--latencia-db", type=float, default=0.002, help="Segundos por sentencia SQL.")
+    parser.add_argument("--retardo", type=float, help="Sustituye BOT_RETARDO durante la simulación.")
+    parser.add_argument("--muestra-memoria", type=int, default=500, help="Partidas para medir la memoria (0: no medir).")
+    parser.add_argument("--semilla", type=int, default=SEMILLA)
+    parser.add_argument("--json", help="Guardar el informe en un archivo JSON.")
+    args = parser.parse_args()
+
+    random.seed(args.semilla)
+    simulacion = Simulacion(args)
+    informe = asyncio.run(simulacion.correr())
+    imprimir(informe)
+    for error in simulacion.errores[:10]:
+        print("Error:", error)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(informe, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
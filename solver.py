@@ -0,0 +1,74 @@
+import random
+
+from simetria import SIMETRIAS
+from tablero import CASILLAS, LLENO, hay_linea
+
+# Tabla de juego perfecto para el tablero de 3x3.
+# Se enumeran una sola vez todas las posiciones alcanzables y, para cada una,
+# se guarda el valor teórico (desde el punto de vista del jugador que mueve)
+# y la lista de jugadas óptimas. Una jugada del bot es entonces una consulta.
+# Las posiciones se guardan en forma canónica (ver simetria.py), así que la
+# tabla solo tiene una entrada por cada 8 posiciones simétricas.
+
+SIMETRIAS_3X3 = SIMETRIAS["3x3"]
+
+# clave: (x << 9) | o canónicos -> (valor, jugadas óptimas en el marco canónico)
+# valor: 1 gana quien mueve, 0 empate, -1 pierde quien mueve
+TABLA = {}
+
+
+def _resolver(propio, rival):
+    # propio: fichas de quien mueve, rival: fichas de quien acaba de mover
+    x, o = (propio, rival) if bin(propio).count("1") == bin(rival).count("1") else (rival, propio)
+    cx, co, t = SIMETRIAS_3X3.canonica(x, o)
+    clave = (cx << 9) | co
+    if clave in TABLA:
+        return TABLA[clave][0]
+    if hay_linea(rival):
+        # El jugador anterior acaba de ganar
+        TABLA[clave] = (-1, ())
+        return -1
+    ocupadas = propio | rival
+    if ocupadas == LLENO:
+        TABLA[clave] = (0, ())
+        return 0
+    mejor = -2
+    jugadas = []
+    for i in range(9):
+        if ocupadas & CASILLAS[i]:
+            continue
+        valor = -_resolver(rival, propio | CASILLAS[i])
+        if valor > mejor:
+            mejor = valor
+            jugadas = [i]
+        elif valor == mejor:
+            jugadas.append(i)
+    TABLA[clave] = (mejor, tuple(sorted(SIMETRIAS_3X3.casilla(t, i) for i in jugadas)))
+    return mejor
+
+
+def construir_tabla():
+    """Enumera todas las posiciones alcanzables desde el tablero vacío."""
+    if not TABLA:
+        _resolver(0, 0)
+    return TABLA
+
+
+def valor(x, o):
+    """Valor teórico de la posición para el jugador que mueve."""
+    return construir_tabla()[SIMETRIAS_3X3.clave(x, o)][0]
+
+
+def jugadas_optimas(x, o):
+    """Lista de jugadas que conservan el valor teórico de la posición."""
+    cx, co, t = SIMETRIAS_3X3.canonica(x, o)
+    return tuple(SIMETRIAS_3X3.deshacer(t, i) for i in construir_tabla()[(cx << 9) | co][1])
+
+
+def mejor_jugada(x, o):
+    """Elige al azar una de las jugadas óptimas, o None si la partida terminó."""
+    jugadas = jugadas_optimas(x, o)
+    return random.choice(jugadas) if jugadas else None
+
+
+construir_tabla()
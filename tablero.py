@@ -0,0 +1,103 @@
+# Representación compacta del tablero (bitboard).
+# Cada jugador ocupa un entero de n*n bits: el bit i está activo si su ficha
+# está en la casilla i (de izquierda a derecha y de arriba a abajo).
+
+
+class Variante:
+    """Tablero de n x n en el que gana quien alinea k fichas."""
+    __slots__ = ("nombre", "n", "k", "total", "casillas", "lineas", "lleno", "centro")
+
+    def __init__(self, nombre, n, k):
+        self.nombre = nombre
+        self.n = n
+        self.k = k
+        self.total = n * n
+        self.casillas = tuple(1 << i for i in range(self.total))
+        self.lleno = (1 << self.total) - 1
+        self.lineas = self._generar_lineas()
+        # Casillas centrales, preferidas para abrir la partida
+        medio = (n - 1) / 2
+        distancias = [abs(i // n - medio) + abs(i % n - medio) for i in range(self.total)]
+        minima = min(distancias)
+        self.centro = tuple(i for i, d in enumerate(distancias) if d == minima)
+
+    def _generar_lineas(self):
+        n, k = self.n, self.k
+        lineas = []
+        for fila in range(n):
+            for col in range(n):
+                # Derecha, abajo, diagonal y antidiagonal
+                for df, dc in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                    ultima_fila = fila + df * (k - 1)
+                    ultima_col = col + dc * (k - 1)
+                    if not (0 <= ultima_fila < n and 0 <= ultima_col < n):
+                        continue
+                    mascara = 0
+                    for paso in range(k):
+                        mascara |= 1 << ((fila + df * paso) * n + col + dc * paso)
+                    lineas.append(mascara)
+        return tuple(lineas)
+
+    def hay_linea(self, bits):
+        """Indica si las fichas de un jugador forman alguna línea ganadora."""
+        for linea in self.lineas:
+            if bits & linea == linea:
+                return True
+        return False
+
+    def libres(self, x, o):
+        """Lista de casillas vacías."""
+        vacias = ~(x | o) & self.lleno
+        return [i for i in range(self.total) if vacias & self.casillas[i]]
+
+    def desde_texto(self, texto):
+        """Convierte el formato de la tabla partidas ("X O  ...") en (x, o)."""
+        x = o = 0
+        for i, c in enumerate(texto):
+            if c == "X":
+                x |= self.casillas[i]
+            elif c == "O":
+                o |= self.casillas[i]
+        return x, o
+
+    def a_texto(self, x, o):
+        """Convierte (x, o) en el texto de n*n caracteres de la tabla partidas."""
+        return ''.join(
+            "X" if x & m else "O" if o & m else " "
+            for m in self.casillas
+        )
+
+
+# Variantes disponibles en /start (Discord admite como máximo 5x5 botones)
+VARIANTES = {
+    "3x3": Variante("3x3", 3, 3),
+    "4x4": Variante("4x4", 4, 4),
+    "5x5": Variante("5x5", 5, 4),
+}
+
+
+def variante_de_texto(texto):
+    """Deduce la variante a partir de la longitud del tablero guardado."""
+    for variante in VARIANTES.values():
+        if variante.total == len(texto):
+            return variante
+    raise ValueError(f"Tablero de longitud no válida: {len(texto)}")
+
+
+def variante_de_tamano(n):
+    """Variante con tablero de n x n."""
+    for variante in VARIANTES.values():
+        if variante.n == n:
+            return variante
+    raise ValueError(f"Tamaño de tablero no válido: {n}")
+
+
+# Atajos para el tablero clásico de 3x3
+CLASICO = VARIANTES["3x3"]
+LINEAS = CLASICO.lineas
+LLENO = CLASICO.lleno
+CASILLAS = CLASICO.casillas
+hay_linea = CLASICO.hay_linea
+libres = CLASICO.libres
+desde_texto = CLASICO.desde_texto
+a_texto = CLASICO.a_texto
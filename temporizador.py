@@ -0,0 +1,123 @@
+import asyncio
+import inspect
+import math
+import time
+
+from metricas import Contador, Medidor
+
+# Rueda de temporizadores (hashed timing wheel) para los plazos del bot.
+# Un único bucle avanza la rueda cada `resolucion` segundos. Cada plazo se
+# guarda en la ranura de su tick de vencimiento módulo el número de ranuras,
+# de modo que programar y cancelar son O(1) y cada tick solo revisa una
+# ranura; los plazos de más de una vuelta esperan en su ranura a que llegue
+# su tick. Los plazos vencidos en un tick se entregan juntos, agrupados por
+# tipo, al manejador del tipo, que puede atenderlos en lote.
+
+TEMPORIZADORES_ACTIVOS = Medidor(
+    "lavieja_temporizadores_activos", "Plazos programados en la rueda.", ("tipo",)
+)
+TEMPORIZADORES_VENCIDOS = Contador(
+    "lavieja_temporizadores_vencidos_total", "Plazos que llegaron a vencer.", ("tipo",)
+)
+
+
+class RuedaTemporizadores:
+    def __init__(self, resolucion=1.0, ranuras=512):
+        self.resolucion = resolucion  # Segundos por tick: precisión de los plazos
+        self._ranuras = [{} for _ in range(ranuras)]  # (tipo, clave) -> (tick, dato)
+        self._ubicacion = {}  # (tipo, clave) -> índice de su ranura
+        self._manejadores = {}  # tipo -> manejador(lote)
+        self._inicio = time.monotonic()  # Instante del tick 0
+        self._tick = 0  # Último tick procesado
+        self._tarea = None
+        self._atendiendo = set()  # Manejadores asíncronos en curso
+        TEMPORIZADORES_ACTIVOS.funcion = self._activos_por_tipo
+
+    def __len__(self):
+        return len(self._ubicacion)
+
+    def _activos_por_tipo(self):
+        activos = {}
+        for tipo, _ in self._ubicacion:
+            activos[tipo] = activos.get(tipo, 0) + 1
+        return activos
+
+    def al_vencer(self, tipo, manejador):
+        """Registra manejador(lote) para los plazos de un tipo; lote es [(clave, dato)]."""
+        self._manejadores[tipo] = manejador
+
+    def programar(self, tipo, clave, segundos, dato=None):
+        """Programa (o reprograma) el plazo de una clave dentro de segundos."""
+        self.cancelar(tipo, clave)
+        tick = max(
+            self._tick + 1,
+            math.ceil((time.monotonic() + segundos - self._inicio) / self.resolucion)
+        )
+        indice = tick % len(self._ranuras)
+        self._ranuras[indice][(tipo, clave)] = (tick, dato)
+        self._ubicacion[(tipo, clave)] = indice
+
+    def cancelar(self, tipo, clave):
+        """Cancela un plazo; devuelve si estaba programado."""
+        indice = self._ubicacion.pop((tipo, clave), None)
+        if indice is None:
+            return False
+        del self._ranuras[indice][(tipo, clave)]
+        return True
+
+    def avanzar(self, ahora=None):
+        """Procesa los ticks transcurridos; devuelve {tipo: [(clave, dato)]} de los vencidos."""
+        if ahora is None:
+            ahora = time.monotonic()
+        objetivo = int((ahora - self._inicio) / self.resolucion)
+        vencidos = {}
+        while self._tick < objetivo:
+            self._tick += 1
+            ranura = self._ranuras[self._tick % len(self._ranuras)]
+            listos = [clave for clave, (tick, _) in ranura.items() if tick <= self._tick]
+            for clave in listos:
+                _, dato = ranura.pop(clave)
+                del self._ubicacion[clave]
+                vencidos.setdefault(clave[0], []).append((clave[1], dato))
+        return vencidos
+
+    async def iniciar(self):
+        """Arranca el bucle que avanza la rueda."""
+        if self._tarea is None:
+            self._tarea = asyncio.create_task(self._bucle())
+
+    async def _bucle(self):
+        while True:
+            await asyncio.sleep(self.resolucion)
+            for tipo, lote in self.avanzar().items():
+                TEMPORIZADORES_VENCIDOS.inc(len(lote), tipo=tipo)
+                manejador = self._manejadores.get(tipo)
+                if manejador is None:
+                    continue
+                try:
+                    resultado = manejador(lote)
+                except Exception as e:
+                    print(f"Error al atender plazos de {tipo}:", e)
+                    continue
+                if inspect.isawaitable(resultado):
+                    # Atender el lote no retrasa los ticks siguientes
+                    tarea = asyncio.ensure_future(self._atender(tipo, resultado))
+                    self._atendiendo.add(tarea)
+                    tarea.add_done_callback(self._atendiendo.discard)
+
+    async def _atender(self, tipo, resultado):
+        try:
+            await resultado
+        except Exception as e:
+            print(f"Error al atender plazos de {tipo}:", e)
+
+    async def cerrar(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+        for tarea in list(self._atendiendo):
+            tarea.cancel()
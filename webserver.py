@@ -1,14 +1,173 @@
-from flask import Flask
-from threading import Thread
+import asyncio
+import hmac
+import time
 
-app = Flask('')
-@app.route('/')
-def index():
-    return "¡Estoy vivo!"
+from aiohttp import web
 
-def run():
-    app.run(host='0.0.0.0', port=8000)
+from metricas import REGISTRO, RETRASO_LOOP
 
-def keep_alive(): 
-    server = Thread(target=run)
-    server.start()   
\ No newline at end of file
+# Servidor HTTP de salud, métricas y administración.
+# Corre con aiohttp en el mismo event loop que el bot: no necesita hilos
+# propios y puede leer el estado del bot directamente. Rutas:
+#
+#   /                 Respuesta fija para los servicios que mantienen vivo el proceso
+#   /metrics          Métricas en formato de texto de Prometheus
+#   /vivo             Liveness: el event loop responde
+#   /listo, /salud    Readiness: arranque completo, shards conectados, MySQL responde
+#                     y el loop no va atrasado
+#   /admin/partidas   Partidas en memoria (requiere ADMIN_TOKEN)
+#   /admin/partidas/{message_id}
+
+
+class ServidorSalud:
+    def __init__(self, puerto=8000, host="0.0.0.0", shards=None, db=None, partidas=None, arranque=None,
+                 token_admin=None, retraso_max=0.5, intervalo_retraso=0.5, intervalo_db=5.0):
+        self.puerto = puerto
+        self.host = host
+        self.shards = shards  # Función que devuelve el estado de cada shard
+        self.db = db  # BaseDeDatos cuya conexión se comprueba
+        self.partidas = partidas  # RegistroPartidas del bot
+        self.arranque = arranque  # Arranque con las etapas pendientes del bot
+        self.token_admin = token_admin  # Sin token, las rutas de administración no existen
+        self.retraso_max = retraso_max  # Segundos de retraso del loop a partir de los que no está listo
+        self.intervalo_retraso = intervalo_retraso  # Segundos entre mediciones del retraso
+        self.intervalo_db = intervalo_db  # Segundos durante los que se reutiliza la última comprobación de MySQL
+        self.retraso = 0.0
+        self._db_ok = None  # (instante, resultado) de la última comprobación de MySQL
+        self._runner = None
+        self._tarea = None
+
+    def aplicacion(self):
+        app = web.Application()
+        app.router.add_get("/", self.index)
+        app.router.add_get("/metrics", self.metrics)
+        app.router.add_get("/vivo", self.vivo)
+        app.router.add_get("/listo", self.listo)
+        app.router.add_get("/salud", self.listo)
+        if self.token_admin:
+            app.router.add_get("/admin/partidas", self.admin_partidas)
+            app.router.add_get("/admin/partidas/{message_id:[0-9]+}", self.admin_partida)
+        return app
+
+    async def iniciar(self):
+        """Empieza a escuchar y a medir el retraso del event loop."""
+        if self._runner is not None:
+            return
+        runner = web.AppRunner(self.aplicacion(), access_log=None)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, self.host, self.puerto).start()
+        except Exception:
+            await runner.cleanup()
+            raise
+        self._runner = runner
+        self._tarea = asyncio.create_task(self._medir_retraso())
+
+    async def _medir_retraso(self):
+        # Lo que tarda en despertar un sleep más allá de lo pedido es el tiempo
+        # que otras tareas han tenido ocupado el loop
+        while True:
+            inicio = time.perf_counter()
+            await asyncio.sleep(self.intervalo_retraso)
+            self.retraso = max(0.0, time.perf_counter() - inicio - self.intervalo_retraso)
+            RETRASO_LOOP.set(self.retraso)
+
+    async def cerrar(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _comprobar_db(self):
+        ahora = time.monotonic()
+        if self._db_ok is None or ahora - self._db_ok[0] > self.intervalo_db:
+            self._db_ok = (ahora, await self.db.comprobar())
+        return self._db_ok[1]
+
+    # Rutas públicas
+
+    async def index(self, request):
+        return web.Response(text="¡Estoy vivo!")
+
+    async def metrics(self, request):
+        return web.Response(
+            body=REGISTRO.exportar().encode(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+        )
+
+    async def vivo(self, request):
+        return web.json_response({"vivo": True, "retraso_loop": round(self.retraso, 4)})
+
+    async def listo(self, request):
+        shards = self.shards() if self.shards is not None else {}
+        db_ok = await self._comprobar_db() if self.db is not None else True
+        comprobaciones = {
+            "arranque": self.arranque is None or self.arranque.completo,
+            "shards": bool(shards) and all(s["conectado"] for s in shards.values()),
+            "db": db_ok,
+            "loop": self.retraso <= self.retraso_max,
+        }
+        listo = all(comprobaciones.values())
+        return web.json_response({
+            "listo": listo,
+            "comprobaciones": comprobaciones,
+            "retraso_loop": round(self.retraso, 4),
+            "arranque": self.arranque.estado() if self.arranque is not None else {},
+            "shards": {str(k): v for k, v in shards.items()},
+        }, status=200 if listo else 503)
+
+    # Administración
+
+    def _autorizado(self, request):
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        return hmac.compare_digest(token.encode(), self.token_admin.encode())
+
+    async def admin_partidas(self, request):
+        if not self._autorizado(request):
+            raise web.HTTPUnauthorized()
+        try:
+            limite = int(request.query.get("limite", "100"))
+        except ValueError:
+            raise web.HTTPBadRequest(text="limite debe ser un número")
+        guild_id = request.query.get("guild_id")
+        # De la más reciente a la más antigua, sin marcarlas como usadas
+        resumen = []
+        for message_id, game in reversed(self.partidas.items()):
+            if guild_id is not None and str(game.guild_id) != guild_id:
+                continue
+            resumen.append(self._resumen(message_id, game))
+            if len(resumen) >= limite:
+                break
+        return web.json_response({"total": len(self.partidas), "partidas": resumen})
+
+    async def admin_partida(self, request):
+        if not self._autorizado(request):
+            raise web.HTTPUnauthorized()
+        message_id = int(request.match_info["message_id"])
+        game = self.partidas.consultar(message_id)
+        if game is None:
+            raise web.HTTPNotFound(text="Partida no encontrada")
+        datos = self._resumen(message_id, game)
+        n = game.variante.n
+        tablero = game.tablero
+        datos["tablero"] = [tablero[f * n:(f + 1) * n] for f in range(n)]
+        return web.json_response(datos)
+
+    def _resumen(self, message_id, game):
+        return {
+            "message_id": str(message_id),
+            "guild_id": str(game.guild_id),
+            "variante": game.variante.nombre,
+            "jugadores": game.jugadores,
+            "turno": game.jugador_actual,
+            "modo_vs_bot": game.modo_vs_bot,
+            "dificultad": game.dificultad,
+            "jugadas": (game.x | game.o).bit_count(),
+            "inactiva": round(self.partidas.inactividad(message_id), 1),
+        }